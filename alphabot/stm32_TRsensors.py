@@ -21,7 +21,9 @@ Note: library adapted in micropython for using 5 QTR sensors on Alphabot v2 robo
 """
 
 import pyb
+import micropython
 from micropython import const
+from array import array
 import utime
 
 PIN_CS = 'D10'
@@ -39,10 +41,29 @@ QTR_NO_EMITTER_PIN = const(0xff)
 
 QTR_MAX_SENSORS = const(16)
 
+# TLC1543 serial frame: 4 address bits clocked in while the 10 bits of the
+# previous conversion are clocked out (MSB first), then a conversion of 21us max
+TLC1543_ADDRESS_BITS = const(4)
+TLC1543_DATA_BITS = const(10)
+TLC1543_CONVERSION_US = const(21)
+# 16-clock frames in SPI mode (2 bytes per channel, extra clocks are ignored)
+TLC1543_SPI_FRAME = const(2)
+# Max I/O clock of the TLC1543 is 2.1MHz
+TLC1543_SPI_BAUDRATE = const(2000000)
+
+# Calibrated values range from 0 to QTR_CALIBRATED_MAX, computed with per
+# sensor fixed-point scales QTR_CALIBRATED_MAX / (max - min) of QTR_SCALE_SHIFT bits
+QTR_CALIBRATED_MAX = const(1000)
+QTR_SCALE_SHIFT = const(16)
+
 class TRSensors(object):
 
-  """ Base class data member initialization (called by derived class init()). """
-  def __init__(self, cs=PIN_CS, dout=PIN_DOUT, addr=PIN_ADDR, clk=PIN_CLK):
+  """ Base class data member initialization (called by derived class init()).
+  spi selects the transport to the TLC1543: None bit-bangs the pins from
+  Python, True uses a machine.SoftSPI on the pins (DOUT is on D11 and ADDR on
+  D12, the opposite of the board's hardware SPI MOSI and MISO), or an SPI
+  object (mode 0, e.g. machine.SPI on a rewired board). """
+  def __init__(self, cs=PIN_CS, dout=PIN_DOUT, addr=PIN_ADDR, clk=PIN_CLK, spi=None):
 
     self._cs = pyb.Pin(cs, pyb.Pin.OUT)
     self._dout = pyb.Pin(dout, pyb.Pin.IN)
@@ -55,42 +76,102 @@ class TRSensors(object):
     self.calibratedMax = [1023] * self._numSensors
     self.last_value = 0
 
+    self._cs.on()
+    self._clk.off()
+    self._values = array('H', [0] * self._numSensors)
+    # Non zero while the main program reads the ADC or changes the calibration:
+    # a TRSampler acquisition then skips its tick instead of breaking the frame
+    self._busy = 0
+    self._calibrated = array('H', [0] * self._numSensors)
+    self._ranges = array('i', [0] * self._numSensors)
+    self._scales = array('i', [0] * self._numSensors)
+    self._updateScales()
+
+    if spi is True:
+      import machine
+      spi = machine.SoftSPI(baudrate=TLC1543_SPI_BAUDRATE, polarity=0, phase=0,
+        sck=machine.Pin(clk), mosi=machine.Pin(addr), miso=machine.Pin(dout))
+    self._spi = spi
+    if spi:
+      # One frame per channel, the address in the 4 MSB of the first byte
+      n = self._numSensors + 1
+      self._tx = bytearray(TLC1543_SPI_FRAME * n)
+      self._rx = bytearray(TLC1543_SPI_FRAME * n)
+      for j in range(n):
+        self._tx[TLC1543_SPI_FRAME * j] = j << (8 - TLC1543_ADDRESS_BITS)
+      tx = memoryview(self._tx)
+      rx = memoryview(self._rx)
+      self._tx_frames = [tx[TLC1543_SPI_FRAME * j:TLC1543_SPI_FRAME * (j + 1)] for j in range(n)]
+      self._rx_frames = [rx[TLC1543_SPI_FRAME * j:TLC1543_SPI_FRAME * (j + 1)] for j in range(n)]
+      self._transfer = self._read_spi
+    else:
+      self._transfer = self._read_pins
+
   """ Reads the sensor values using TLC1543 ADC chip into an array. 
   The values returned are a measure of the reflectance in abstract units,
   with higher values corresponding to lower reflectance (e.g. a black
   surface or a void). """
 
   def analogRead(self):
-    value = [0]* (self._numSensors+1)
-    #Read Channel0~channel4 AD value
-    for j in range(0, self._numSensors+1):
-      self._cs.off()
-      for i in range(0,4):
-        #sent 4-bit Address
-        if (j >> (3 - i)) & 0x01:
-          self._addr.on()
-        else:
-          self._addr.off()
-        #read MSB 4-bit data
-        value[j] <<= 1
-        if self._dout.value():
-          value[j] |= 0x01
-        self._clk.on()
-        self._clk.off()
-      for i in range(0, self._numSensors+1):
-        #read LSB 8-bit data
-        value[j] <<= 1
-        if self._dout.value():
-          value[j] |= 0x01
-        self._clk.on()
-        self._clk.off()
-      #no mean ,just delay
-      #for i in range(0,6):
-      #  self._clk.on()
-      #  self._clk.off()
-      utime.sleep_us(100)
-      self._cs.on()
-    return value[1:]
+    self._read(self._values)
+    return list(self._values)
+
+  """ Same as analogRead() into values, an array('H') of numSensors items,
+  without allocation. """
+
+  def analogReadInto(self, values):
+    self._read(values)
+
+  def _read(self, values):
+    self._busy += 1
+    self._transfer(values)
+    self._busy -= 1
+
+  """ Reads channel 0 to numSensors - 1 into values, in a single CS window:
+  each frame clocks in the address of the next channel while the result of
+  the previous one is clocked out, so numSensors + 1 frames are needed (the
+  result of the first frame is discarded). CS stays low between frames, the
+  TLC1543 only needs the conversion time before the next frame. """
+
+  def _read_pins(self, values):
+    addr = self._addr
+    clk = self._clk
+    dout = self._dout.value
+    sleep_us = utime.sleep_us
+    self._cs.off()
+    for j in range(self._numSensors + 1):
+      value = 0
+      for i in range(TLC1543_DATA_BITS):
+        if i < TLC1543_ADDRESS_BITS:
+          # sent 4-bit Address, MSB first
+          addr.value((j >> (TLC1543_ADDRESS_BITS - 1 - i)) & 0x01)
+        # read 10-bit data, MSB first
+        value = (value << 1) | dout()
+        clk.on()
+        clk.off()
+      if j:
+        values[j - 1] = value
+      # conversion of channel j
+      sleep_us(TLC1543_CONVERSION_US)
+    self._cs.on()
+
+  """ Same as _read_pins() with a 16-clock SPI transfer per frame. """
+
+  def _read_spi(self, values):
+    spi = self._spi
+    tx = self._tx_frames
+    rx = self._rx_frames
+    sleep_us = utime.sleep_us
+    self._cs.off()
+    for j in range(self._numSensors + 1):
+      spi.write_readinto(tx[j], rx[j])
+      sleep_us(TLC1543_CONVERSION_US)
+    self._cs.on()
+    # 10-bit results in the MSB of each frame, skip the first frame
+    rx = self._rx
+    for j in range(self._numSensors):
+      k = TLC1543_SPI_FRAME * (j + 1)
+      values[j] = (rx[k] << 2) | (rx[k + 1] >> 6)
 
   """ Reads the sensors 10 times and uses the results for
   calibration.  The sensor values are not returned instead, the
@@ -98,6 +179,7 @@ class TRSensors(object):
   and used for the readCalibrated() method. """
 
   def calibrate(self):
+    self._busy += 1
     sensor_values = []
     max_sensor_values = [0]*self._numSensors
     min_sensor_values = [0]*self._numSensors
@@ -118,6 +200,30 @@ class TRSensors(object):
         self.calibratedMax[i] = min_sensor_values[i]
       if max_sensor_values[i] < self.calibratedMin[i]:
         self.calibratedMin[i] = max_sensor_values[i]
+    self._updateScales()
+    self._busy -= 1
+
+  """ Sets the calibration values (lists of numSensors minimum and maximum
+  raw values). Call it instead of changing calibratedMin and calibratedMax,
+  or call it with no argument after changing them. """
+
+  def setCalibration(self, calibratedMin=None, calibratedMax=None):
+    self._busy += 1
+    if calibratedMin is not None:
+      self.calibratedMin = list(calibratedMin)
+    if calibratedMax is not None:
+      self.calibratedMax = list(calibratedMax)
+    self._updateScales()
+    self._busy -= 1
+
+  def _updateScales(self):
+    for i in range(self._numSensors):
+      denominator = self.calibratedMax[i] - self.calibratedMin[i]
+      self._ranges[i] = denominator
+      if denominator > 0:
+        self._scales[i] = ((QTR_CALIBRATED_MAX << QTR_SCALE_SHIFT) + (denominator >> 1)) // denominator
+      else:
+        self._scales[i] = 0
 
   """ Returns values calibrated to a value between 0 and 1000, where
   0 corresponds to the minimum value read by calibrate() and 1000
@@ -126,22 +232,33 @@ class TRSensors(object):
   sensors are accounted for automatically. """
 
   def readCalibrated(self):
+    self.readCalibratedInto(self._calibrated)
+    return list(self._calibrated)
+
+  """ Same as readCalibrated() into values, an array('H') of numSensors
+  items, with integers only and without allocation. """
+
+  def readCalibratedInto(self, values):
 
     # read the needed values
-    sensor_values = self.analogRead()
+    self._read(values)
+    self._calibrateValues(values)
+
+  """ Replaces the raw values by the calibrated values. """
 
+  def _calibrateValues(self, values):
+    calibratedMin = self.calibratedMin
+    ranges = self._ranges
+    scales = self._scales
     for i in range(self._numSensors):
-      denominator = self.calibratedMax[i] - self.calibratedMin[i]
-      value = 0
-      if denominator is not 0:
-        value = (sensor_values[i] - self.calibratedMin[i]) * 1000 / denominator
-      if value < 0:
+      value = values[i] - calibratedMin[i]
+      if value <= 0 or not scales[i]:
         value = 0
-      elif value > 1000:
-        value = 1000
-      sensor_values[i] = value
-
-    return sensor_values
+      elif value >= ranges[i]:
+        value = QTR_CALIBRATED_MAX
+      else:
+        value = (value * scales[i]) >> QTR_SCALE_SHIFT
+      values[i] = value
 
   """ Operates the same as read calibrated, but also returns an
   estimated position of the robot with respect to a line. The
@@ -164,36 +281,174 @@ class TRSensors(object):
   before the averaging. """
 
   def readLine(self, white_line = 0):
+    position = self.readLineInto(self._calibrated, white_line)
+    return position, list(self._calibrated)
+
+  """ Same as readLine() with the calibrated values written into values, an
+  array('H') of numSensors items. Returns the position, an integer, computed
+  without allocation. """
+
+  def readLineInto(self, values, white_line = 0):
+
+    self.readCalibratedInto(values)
+    return self._linePosition(values, white_line)
 
-    sensor_values = self.readCalibrated()
+  """ Line position from the calibrated values. """
+
+  def _linePosition(self, values, white_line):
     avg = 0
     sum = 0
     on_line = 0
     for i in range(0, self._numSensors):
-      value = sensor_values[i]
+      value = values[i]
       if white_line:
-        value = 1000-value
+        value = QTR_CALIBRATED_MAX - value
       # keep track of whether we see the line at all
       if value > 200:
         on_line = 1
-        
+
       # only average in values that are above a noise threshold
       if value > 50:
         avg += value * (i * 1000)  # this is for the weighted total,
-        sum += value               # this is for the denominator 
+        sum += value               # this is for the denominator
 
     if on_line != 1:
       # If it last read to the left of center, return 0.
-      if self.last_value < (self._numSensors - 1)*1000/2:
+      if self.last_value < (self._numSensors - 1)*1000//2:
         #print("left")
         self.last_value = 0
-  
+
       # If it last read to the right of center, return the max.
       else:
         #print("right")
         self.last_value = (self._numSensors - 1)*1000
 
     else:
-      self.last_value = avg/sum
-    
-    return self.last_value,sensor_values;
+      self.last_value = avg//sum
+
+    return self.last_value
+
+
+""" Samples the line sensors in the background: a hardware timer schedules
+(micropython.schedule) an acquisition at a fixed rate, so the control loop
+gets the latest line position instantly instead of waiting for the ADC.
+Each acquisition reads the sensors oversample times and keeps the median
+(median=True) or the mean of the raw values, then computes the calibrated
+values and the line position into the back buffer of a double buffer, which
+becomes the front buffer once complete. Timer ticks arriving while an
+acquisition is still pending are counted in overruns, acquisitions skipped
+because the main program is reading the sensors or calibrating are counted
+in skipped.
+timer is the id of a pyb.Timer free on the board (on the AlphaBot2 timers
+1 and 2 drive the motors; not all STM32 have the same timers, e.g. the
+STM32WB55 has no TIM4). """
+
+class TRSampler(object):
+
+  def __init__(self, sensors, timer, freq=100, oversample=1, median=False, white_line=0):
+    self._sensors = sensors
+    self._freq = freq
+    self._timer_id = timer
+    self._timer = None
+    self._oversample = oversample
+    self._median = median
+    self._white_line = white_line
+    n = sensors._numSensors
+    self._samples = [array('H', [0] * n) for _ in range(oversample)]
+    self._column = array('H', [0] * oversample)
+    self._buffers = (array('H', [0] * n), array('H', [0] * n))
+    self._positions = array('i', [0, 0])
+    self._timestamps = array('i', [0, 0])
+    self._front = 0
+    self._pending = False
+    self.samples = 0
+    self.overruns = 0
+    self.skipped = 0
+    # Allocate the bound methods once
+    self._tick_ref = self._tick
+    self._sample_ref = self._sample
+
+  def start(self):
+    if self._timer is None:
+      self._timer = pyb.Timer(self._timer_id, freq=self._freq, callback=self._tick_ref)
+
+  def stop(self):
+    if self._timer is not None:
+      self._timer.deinit()
+      self._timer = None
+
+  """ Returns (position, calibrated values, timestamp in ms) of the latest
+  sample. The values array is overwritten two samples later: copy it, or
+  use readLineInto(), to keep it. """
+
+  def readLine(self):
+    front = self._front
+    return self._positions[front], self._buffers[front], self._timestamps[front]
+
+  """ Copies the calibrated values of the latest sample into values, an
+  array('H') of numSensors items, and returns the line position. """
+
+  def readLineInto(self, values):
+    front = self._front
+    buffer = self._buffers[front]
+    for i in range(len(buffer)):
+      values[i] = buffer[i]
+    return self._positions[front]
+
+  """ Timestamp (utime.ticks_ms()) of the latest sample. """
+
+  def timestamp(self):
+    return self._timestamps[self._front]
+
+  # Timer interrupt: no allocation, the acquisition is scheduled
+  def _tick(self, tim):
+    if self._pending:
+      self.overruns += 1
+      return
+    self._pending = True
+    try:
+      micropython.schedule(self._sample_ref, 0)
+    except RuntimeError:
+      self._pending = False
+      self.overruns += 1
+
+  def _sample(self, _):
+    sensors = self._sensors
+    if sensors._busy:
+      # The main program is in the middle of a TLC1543 frame or of a calibration
+      self.skipped += 1
+      self._pending = False
+      return
+    back = 1 - self._front
+    values = self._buffers[back]
+    timestamp = utime.ticks_ms()
+    if self._oversample == 1:
+      sensors._transfer(values)
+    else:
+      samples = self._samples
+      for sample in samples:
+        sensors._transfer(sample)
+      column = self._column
+      count = self._oversample
+      for i in range(len(values)):
+        if self._median:
+          # insertion sort of the values of sensor i
+          for k in range(count):
+            value = samples[k][i]
+            j = k
+            while j and column[j - 1] > value:
+              column[j] = column[j - 1]
+              j -= 1
+            column[j] = value
+          values[i] = column[count >> 1]
+        else:
+          total = 0
+          for k in range(count):
+            total += samples[k][i]
+          values[i] = total // count
+    sensors._calibrateValues(values)
+    self._positions[back] = sensors._linePosition(values, self._white_line)
+    self._timestamps[back] = timestamp
+    self._front = back
+    self.samples += 1
+    self._pending = False
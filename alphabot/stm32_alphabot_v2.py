@@ -28,7 +28,7 @@ SOFTWARE.
 __version__ = "0.0.0-auto.0"
 __repo__ = "https://github.com/Vittascience/stm32-libraries"
 
-from stm32_TRsensors import TRSensors
+from stm32_TRsensors import TRSensors, TRSampler
 from stm32_pcf8574 import PCF8574
 import machine
 import pyb
@@ -90,6 +90,8 @@ class AlphaBot_v2(object):
       clk = ALPHABOT_V2_PIN_TRS_CLK
     )
 
+    self.tr_sampler = None
+
     print('[Alpha_INFO]: TR sensors initialised')
 
     self.i2c = machine.I2C(1)
@@ -197,8 +199,28 @@ class AlphaBot_v2(object):
   def TRSensors_calibrate(self):
     self.tr_sensors.calibrate()
 
+  # Samples the TR sensors in the background with the pyb.Timer timer (not 1
+  # nor 2, used by the motors), TRSensors_readLine() then returns the latest
+  # sample without waiting for the ADC
+  def TRSensors_startSampling(self, timer, freq = 100, oversample = 1, median = False):
+    if timer in (1, 2):
+      raise ValueError('timer %d drives the motors' % timer)
+    if self.tr_sampler is None:
+      self.tr_sampler = TRSampler(self.tr_sensors, timer, freq=freq, oversample=oversample, median=median)
+      self.tr_sampler.start()
+
+  def TRSensors_stopSampling(self):
+    if self.tr_sampler is not None:
+      self.tr_sampler.stop()
+      self.tr_sampler = None
+
   def TRSensors_readLine(self, sensor = 0):
-    position, sensor_values = self.tr_sensors.readLine()
+    if self.tr_sampler is not None:
+      position, sensor_values, timestamp = self.tr_sampler.readLine()
+      # Copy: the sampler overwrites its buffers
+      sensor_values = list(sensor_values)
+    else:
+      position, sensor_values = self.tr_sensors.readLine()
     if sensor is 0:
       return sensor_values
     else:
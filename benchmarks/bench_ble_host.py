@@ -0,0 +1,161 @@
+# BLE benchmarks on a PC, using the host stand-in of the "bluetooth" module:
+# notifications/s and bytes/s sent by BLEUART.write and BLESensor.set_data,
+# RX bytes/s through BlueUart and BLEUART, IRQ handler time and allocations
+# per event. Allocations are measured with tracemalloc (CPython objects), they
+# are an indication of the allocations made on the board, not an exact count.
+# Also checks the BLESensor.publish() scheduler (skipped values, retries).
+#   python benchmarks/bench_ble_host.py   (from the repository root)
+
+import sys
+sys.path.insert(0, 'host')
+sys.path.append('bluetooth')
+import time
+import tracemalloc
+
+import bluetooth
+from ble_central import Central
+
+_EVENTS = 2000
+
+
+def reset():
+  bluetooth.BLE.reset()
+  return bluetooth.BLE()
+
+
+# Runs func count times, returns (seconds, (retained blocks per event, peak heap growth in bytes)).
+# Timing and allocations are measured in two separate runs as tracemalloc slows
+# everything down.
+def measure(func, count=_EVENTS):
+  t0 = time.perf_counter()
+  for i in range(count):
+    func(i)
+  dt = time.perf_counter() - t0
+  tracemalloc.start()
+  snapshot = tracemalloc.take_snapshot()
+  tracemalloc.reset_peak()
+  base = tracemalloc.get_traced_memory()[0]
+  for i in range(count):
+    func(i)
+  peak = tracemalloc.get_traced_memory()[1] - base
+  stats = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+  tracemalloc.stop()
+  blocks = sum(s.count_diff for s in stats if s.count_diff > 0)
+  return dt, (blocks / count, peak)
+
+
+def report(name, dt, count, nbytes, allocs, ble):
+  irq = ble.stats.irq_time_s / ble.stats.irq_count * 1e6 if ble.stats.irq_count else 0
+  # Counters cover both runs of measure()
+  print('%-24s %9d ev/s %11d bytes/s  irq %6.2f us  %5.2f blocks/ev  peak %6d bytes' % (
+    name, count / 2 / dt, nbytes / 2 / dt, irq, allocs[0], allocs[1]))
+
+
+def bench_uart_rx(name, make):
+  ble = reset()
+  uart, rx_handle = make(ble)
+  central = Central()
+  central.connect()
+  packet = b'0123456789abcdef\n'
+  buf = bytearray(64)
+  ble.stats.reset()
+
+  def step(i):
+    central.write(rx_handle, packet)
+    uart.readinto(buf)
+
+  dt, allocs = measure(step)
+  report(name + ' RX', dt, 2 * _EVENTS, 2 * _EVENTS * len(packet), allocs, ble)
+
+
+def bench_uart_tx(name, mtu):
+  from stm32_ble_uart import BLEUART
+  ble = reset()
+  uart = BLEUART(ble)
+  central = Central(mtu=mtu)
+  central.keep_notifications = False
+  ble.config(mtu=mtu)
+  central.connect()
+  central.exchange_mtu()
+  data = bytes(200)
+  ble.stats.reset()
+  dt, allocs = measure(lambda i: uart.write(data))
+  report('%s TX mtu=%d' % (name, mtu), dt, ble.stats.notifications,
+    ble.stats.notified_bytes, allocs, ble)
+
+
+def bench_sensor():
+  from stm32_ble_sensor import BLESensor
+  from stm32_ble_bluest import TemperatureEncoder, feature_uuid
+  ble = reset()
+  handles = []
+
+  def register(sensor):
+    ((handle,),) = ble.gatts_register_services(
+      ((sensor._ST_APP_SERVICE[0], ((feature_uuid(TemperatureEncoder.MASK), bluetooth.FLAG_NOTIFY),)),))
+    handles.append(handle)
+
+  sensor = BLESensor(ble, (), TemperatureEncoder.MASK)
+  sensor.init_service(register)
+  central = Central()
+  central.keep_notifications = False
+  central.connect()
+  encoder = TemperatureEncoder()
+  ble.stats.reset()
+  dt, allocs = measure(lambda i: sensor.set_data(encoder.encode_raw(i % 400), handles[0]))
+  report('BLESensor.set_data', dt, ble.stats.notifications, ble.stats.notified_bytes, allocs, ble)
+
+
+# publish()/update(): identical values are skipped although their timestamp
+# differs, a notification refused by the stack (ENOMEM) is retried on the next update()
+def check_sensor_publish():
+  from stm32_ble_sensor import BLESensor
+  from stm32_ble_bluest import TemperatureEncoder, feature_uuid
+  ble = reset()
+  handles = []
+
+  def register(sensor):
+    ((handle,),) = ble.gatts_register_services(
+      ((sensor._ST_APP_SERVICE[0], ((feature_uuid(TemperatureEncoder.MASK), bluetooth.FLAG_NOTIFY),)),))
+    handles.append(handle)
+
+  sensor = BLESensor(ble, (), TemperatureEncoder.MASK, status=None)
+  sensor.init_service(register)
+  sensor.set_rate(handles[0], 0)
+  central = Central()
+  central.connect()
+  encoder = TemperatureEncoder()
+  sensor.publish(encoder.encode(20.2), handles[0])
+  sensor.update()
+  sensor.publish(encoder.encode(20.2), handles[0])
+  sensor.update()
+  assert sensor.stats(handles[0]) == (1, 0, 1, 0), 'identical value notified again'
+  ble.tx_credits = 0
+  sensor.publish(encoder.encode(20.3), handles[0])
+  assert sensor.update() == 0
+  ble.tx_credits = None
+  assert sensor.update() == 1
+  assert sensor.stats(handles[0]) == (2, 0, 1, 1), 'refused notification not retried'
+  assert central.notifications[-1][1][2:] == encoder.buf[2:]
+  print('BLESensor.publish          checks passed')
+
+
+def make_blue_uart(ble):
+  from stm32_ble import BlueUart
+  uart = BlueUart('bench', '6E400001-B5A3-F393-E0A9-E50E24DCCA9E',
+    '6E400003-B5A3-F393-E0A9-E50E24DCCA9E', '6E400002-B5A3-F393-E0A9-E50E24DCCA9E')
+  return uart, uart._rx_handle
+
+
+def make_ble_uart(ble):
+  from stm32_ble_uart import BLEUART
+  uart = BLEUART(ble)
+  return uart, uart._rx_handle
+
+
+bench_uart_rx('BlueUart', make_blue_uart)
+bench_uart_rx('BLEUART', make_ble_uart)
+bench_uart_tx('BLEUART', 23)
+bench_uart_tx('BLEUART', 247)
+bench_sensor()
+check_sensor_publish()
@@ -0,0 +1,149 @@
+# Throughput and allocations of the BLE UART receive path: slicing bytearray
+# (previous implementation of BlueUart/BLEUART.read) against the RingBuffer of
+# stm32_ble_ringbuf. A cycle is one received packet (put) followed by the reads
+# it makes possible. The rings are created before the measurement, their own
+# buffer is not counted.
+# Runs on the board (copy stm32_ble_ringbuf.py next to it) or on a PC:
+#   python benchmarks/bench_ble_rx.py   (from the repository root)
+# On the board, gc.mem_alloc() is read with the collector disabled: the figure is
+# every byte allocated per cycle, the garbage that triggers gc.collect() pauses.
+# On a PC, tracemalloc gives the heap growth of each cycle (peak minus start,
+# measurement overhead removed) of CPython objects: it tells which path allocates
+# and what, not how many bytes the board does. Per read, the slicing path copies
+# the result and the whole remaining backlog (see the backlog rows), the ring
+# buffer allocates only the slice of its memoryview (184 bytes in CPython, one
+# small object on the board) and read() the result. The PC timings are no
+# indication of the board either: CPython slices with a C memcpy while the ring
+# buffer runs bytecode for its index arithmetic, and CPython has no heap to
+# fragment nor collection pauses.
+
+import sys
+sys.path.append('bluetooth')
+import gc
+try:
+  from utime import ticks_us, ticks_diff
+except ImportError:
+  from time import perf_counter
+
+  def ticks_us():
+    return int(perf_counter() * 1000000)
+
+  def ticks_diff(a, b):
+    return a - b
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
+from stm32_ble_ringbuf import RingBuffer
+
+_PACKET = bytes(range(20)) # One ATT write with the default MTU
+_PACKETS = 2000
+_READ_SIZE = 16
+
+
+class SliceBuffer:
+  # Receive path as implemented before the ring buffer
+  def __init__(self):
+    self._rx_buffer = bytearray()
+
+  def put(self, data):
+    self._rx_buffer += data
+
+  def any(self):
+    return len(self._rx_buffer)
+
+  def read(self, sz=None):
+    if not sz:
+      sz = len(self._rx_buffer)
+    result = self._rx_buffer[0:sz]
+    self._rx_buffer = self._rx_buffer[sz:]
+    return result
+
+
+# backlog: bytes left unread, as when the application reads less often than
+# the packets arrive
+def feed(rx, read, backlog=0):
+  rx.put(_PACKET)
+  while rx.any() >= _READ_SIZE + backlog:
+    read(rx)
+
+
+# Bytes allocated per call of step(*args), see the header
+def alloc_per_call(step, *args):
+  if tracemalloc:
+    tracemalloc.start()
+    total = 0
+    for _ in range(_PACKETS):
+      tracemalloc.reset_peak()
+      base = tracemalloc.get_traced_memory()[0]
+      step(*args)
+      total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+  else:
+    gc.collect()
+    gc.disable()
+    m0 = gc.mem_alloc()
+    for _ in range(_PACKETS):
+      step(*args)
+    total = gc.mem_alloc() - m0
+    gc.enable()
+  return total / _PACKETS
+
+
+def nothing(rx, read, backlog):
+  pass
+
+
+def run(name, make, read, backlog=0):
+  if backlog:
+    name += ' backlog %d' % backlog
+  gc.collect()
+  rx = make()
+  t0 = ticks_us()
+  for _ in range(_PACKETS):
+    feed(rx, read, backlog)
+  dt = ticks_diff(ticks_us(), t0)
+  # Allocations measured in a second run (tracemalloc slows the receive path down)
+  alloc = alloc_per_call(feed, make(), read, backlog) - overhead
+  nbytes = _PACKETS * len(_PACKET)
+  print('%-32s %8d us  %10d bytes/s  %7.1f bytes allocated/cycle' % (
+    name, dt, nbytes * 1000000 // max(dt, 1), alloc))
+
+
+buf = bytearray(_READ_SIZE)
+# Measurement overhead (the tuple returned by get_traced_memory() on a PC)
+overhead = alloc_per_call(nothing, None, None, 0)
+print('%s, %d-byte packets, %d-byte reads' % (
+  'Host (tracemalloc): heap growth per cycle' if tracemalloc else 'Board (gc.mem_alloc)',
+  len(_PACKET), _READ_SIZE))
+if tracemalloc:
+  print('CPython objects and timings: no board figures, see the header of this file')
+run('bytearray slicing', SliceBuffer, lambda rx: rx.read(_READ_SIZE))
+run('RingBuffer.read', lambda: RingBuffer(256), lambda rx: rx.read(_READ_SIZE))
+run('RingBuffer.readinto', lambda: RingBuffer(256), lambda rx: rx.readinto(buf))
+run('bytearray slicing', SliceBuffer, lambda rx: rx.read(_READ_SIZE), 128)
+run('RingBuffer.readinto', lambda: RingBuffer(256), lambda rx: rx.readinto(buf), 128)
+
+# A line longer than the ring buffer comes out in pieces instead of blocking the
+# buffer. Bytes of the packet that fills it up are dropped (counted in overflows),
+# the rest of the line and the next lines are received.
+def check_long_line(size=256):
+  rx = RingBuffer(size)
+  line = bytes(0x41 + i % 26 for i in range(size + 44)) + b'\n'
+  data = line + b'next line\n'
+  pieces = []
+  for i in range(0, len(data), len(_PACKET)):
+    rx.put(data[i:i + len(_PACKET)])
+    piece = rx.readline()
+    while piece is not None:
+      pieces.append(bytes(piece))
+      piece = rx.readline()
+  assert pieces[0] == line[:size], 'partial line expected once the buffer is full'
+  assert pieces[-1] == b'next line\n', 'reception blocked after a long line'
+  assert sum(len(p) for p in pieces) + rx.overflows == len(data), 'bytes lost without being counted'
+  print('long line: %d bytes read as %d pieces, %d bytes dropped' % (
+    len(line), len(pieces) - 1, rx.overflows))
+
+
+check_long_line()
@@ -0,0 +1,128 @@
+# Import time and RAM cost of stm32_ble_sensor, and cost of creating a BLESensor,
+# compared with a previous version of the module when one is available.
+# On the board RAM is measured with gc.mem_free(), on a PC with tracemalloc
+# (CPython objects, to compare two versions of the module, not absolute values).
+# Every row measures a first import: on a PC each case runs in its own
+# interpreter, on the board the module is removed from sys.modules beforehand.
+#   python benchmarks/bench_ble_sensor_import.py [previous/stm32_ble_sensor.py]
+# (from the repository root). The previous version can be extracted from git, e.g.
+#   git show 3ba409e~1:bluetooth/stm32_ble_sensor.py > /tmp/stm32_ble_sensor.py
+# On the board, copy it as stm32_ble_sensor_before.py next to the benchmark.
+
+import sys
+sys.path.insert(0, 'host')
+sys.path.append('bluetooth')
+import gc
+try:
+  from utime import ticks_us, ticks_diff
+except ImportError:
+  from time import perf_counter
+
+  def ticks_us():
+    return int(perf_counter() * 1000000)
+
+  def ticks_diff(a, b):
+    return a - b
+
+try:
+  import tracemalloc
+  import importlib.util # Imported here, it is not part of the measurements
+except ImportError:
+  tracemalloc = None
+
+
+def start():
+  gc.collect()
+  if tracemalloc:
+    tracemalloc.start()
+    return 0
+  return gc.mem_free()
+
+
+def used(m0):
+  if tracemalloc:
+    m = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return m
+  gc.collect()
+  return m0 - gc.mem_free()
+
+
+# Every measured import starts from a module that is not loaded yet
+def unload(name):
+  if name in sys.modules:
+    del sys.modules[name]
+
+
+def import_before():
+  unload('stm32_ble_sensor_before')
+  if len(sys.argv) > 1 and sys.argv[1] != '--case':
+    # Load the given file under another module name
+    spec = importlib.util.spec_from_file_location('stm32_ble_sensor_before', sys.argv[1])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+  return __import__('stm32_ble_sensor_before')
+
+
+def import_after():
+  unload('stm32_ble_sensor')
+  return __import__('stm32_ble_sensor')
+
+
+def bench(label, load, **kwargs):
+  if hasattr(bluetooth.BLE, 'reset'):
+    bluetooth.BLE.reset() # Host stand-in: start from an inactive radio
+  m0 = start()
+  t0 = ticks_us()
+  try:
+    module = load()
+  except ImportError:
+    if tracemalloc:
+      tracemalloc.stop()
+    print('%-8s not available: pass the previous stm32_ble_sensor.py as argument' % label)
+    print('         (on the board, copy it as stm32_ble_sensor_before.py)')
+    return
+  dt = ticks_diff(ticks_us(), t0)
+  print('%-8s import:      %8d us %8d bytes' % (label, dt, used(m0)))
+  m0 = start()
+  t0 = ticks_us()
+  sensor = module.BLESensor(bluetooth.BLE(), (), 0x40000, **kwargs)
+  dt = ticks_diff(ticks_us(), t0)
+  print('%-8s BLESensor(): %8d us %8d bytes' % (label, dt, used(m0)))
+
+
+# Dependencies shared with the other BLE modules are imported first, they are not
+# part of the cost of stm32_ble_sensor itself
+import bluetooth
+import stm32_bleAdvertising
+import stm32_ble_bluest
+import stm32_ble_advpolicy
+import stm32_ble_connparams
+import micropython
+import machine
+import utime
+
+_CASES = (
+  ('before', import_before, {}),
+  ('after', import_after, {}),
+  ('no LEDs', import_after, {'status': None}),
+)
+
+if tracemalloc and '--case' not in sys.argv:
+  # PC: each case runs in a fresh interpreter, so that nothing imported or cached
+  # by a previous case is shared. The .pyc files are written first, compiling
+  # the modules is not part of an import on the board.
+  import subprocess
+  import py_compile
+  for path in ['bluetooth/stm32_ble_sensor.py'] + sys.argv[1:2]:
+    py_compile.compile(path)
+  for i in range(len(_CASES)):
+    subprocess.run([sys.executable, sys.argv[0]] + sys.argv[1:2] + ['--case', str(i)], check=True)
+elif tracemalloc:
+  label, load, kwargs = _CASES[int(sys.argv[sys.argv.index('--case') + 1])]
+  bench(label, load, **kwargs)
+else:
+  # Board: the module is removed from sys.modules before each import
+  for label, load, kwargs in _CASES:
+    bench(label, load, **kwargs)
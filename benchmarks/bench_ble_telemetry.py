@@ -0,0 +1,76 @@
+# Bytes per sample and encoding time of the binary telemetry frames
+# (stm32_ble_telemetry) against the text format ('%d,%d,%d\n').
+# Runs on the board (copy stm32_ble_telemetry.py next to it) or on a PC,
+# where frames are also decoded back with host/telemetry_decoder.py:
+#   python benchmarks/bench_ble_telemetry.py   (from the repository root)
+
+import sys
+sys.path.insert(0, 'host')
+sys.path.append('bluetooth')
+from array import array
+try:
+  from utime import ticks_us, ticks_diff
+except ImportError:
+  from time import perf_counter
+
+  def ticks_us():
+    return int(perf_counter() * 1000000)
+
+  def ticks_diff(a, b):
+    return a - b
+
+from stm32_ble_telemetry import TelemetryEncoder
+
+_SAMPLES = 1024
+_CHANNELS = 3
+
+
+# Slowly varying signals: temperature (0.1 °C), humidity (0.1 %), CO2 (ppm)
+def make_samples():
+  samples = []
+  for i in range(_SAMPLES):
+    samples.append(array('i', (215 + (i % 40) // 8 - 2, 450 + (i % 64) // 16, 420 + (i * 7) % 30)))
+  return samples
+
+
+def bench_text(samples):
+  nbytes = 0
+  t0 = ticks_us()
+  for values in samples:
+    nbytes += len('%d,%d,%d\n' % (values[0], values[1], values[2]))
+  return ticks_diff(ticks_us(), t0), nbytes
+
+
+def bench_binary(samples, per_frame):
+  encoder = TelemetryEncoder(_CHANNELS, per_frame)
+  nbytes = 0
+  stream = bytearray()
+  t0 = ticks_us()
+  for values in samples:
+    frame = encoder.add(values)
+    if frame:
+      nbytes += len(frame)
+      stream += frame
+  frame = encoder.flush()
+  if frame:
+    nbytes += len(frame)
+    stream += frame
+  return ticks_diff(ticks_us(), t0), nbytes, stream
+
+
+def report(name, dt, nbytes):
+  print('%-22s %6.2f bytes/sample %8.2f us/sample' % (name, nbytes / _SAMPLES, dt / _SAMPLES))
+
+
+samples = make_samples()
+dt, nbytes = bench_text(samples)
+report('text', dt, nbytes)
+for per_frame in (8, 16, 32):
+  dt, nbytes, stream = bench_binary(samples, per_frame)
+  report('binary, %d/frame' % per_frame, dt, nbytes)
+  try:
+    from telemetry_decoder import FrameDecoder
+  except ImportError:
+    continue
+  decoded = [s for _, frame in FrameDecoder().feed(stream) for s in frame]
+  assert decoded == [tuple(v) for v in samples], 'decoding mismatch'
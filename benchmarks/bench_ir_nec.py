@@ -0,0 +1,104 @@
+# Decoding time and heap allocation of the NEC decoder (stm32_nec), fed with
+# edge time arrays of NEC bursts (data frames, repeat codes and corrupted
+# frames) as captured by IR_RX. Runs on the board (heap measured with
+# gc.mem_alloc) or on a PC with the host stand-ins (tracemalloc, CPython objects):
+#   python benchmarks/bench_ir_nec.py   (from the repository root)
+
+import sys
+sys.path.insert(0, 'host')
+sys.path.append('remote_control')
+import gc
+try:
+  from utime import ticks_us, ticks_diff
+except ImportError:
+  from time import perf_counter
+
+  def ticks_us():
+    return int(perf_counter() * 1000000)
+
+  def ticks_diff(a, b):
+    return a - b
+
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
+from machine import Pin
+from stm32_nec import NEC_8, NEC_16
+
+_RUNS = 500
+
+
+# Edge times of a NEC burst starting at t0: leader, 32 bits LSB first, stop bit.
+# jitter (µs) is added to every other edge to mimic a real receiver.
+def nec_frame(addr, cmd, t0=1000, jitter=37, cmd_check=None):
+  times = [t0, t0 + 9000, t0 + 13500]
+  t = times[-1]
+  if cmd_check is None:
+    cmd_check = cmd ^ 0xff
+  word = addr | ((addr ^ 0xff) << 8) | (cmd << 16) | (cmd_check << 24)
+  for i in range(32):
+    t += 563 + (jitter if i & 1 else 0)
+    times.append(t)
+    t += 1688 if (word >> i) & 1 else 563
+    times.append(t)
+  t += 563
+  times.append(t)
+  return times
+
+
+def repeat_frame(t0=1000):
+  return [t0, t0 + 9000, t0 + 11250, t0 + 11810]
+
+
+def bad_data_frame():
+  return nec_frame(0x10, 0x45, cmd_check=0x00)
+
+
+def mem_alloc():
+  if tracemalloc:
+    return tracemalloc.get_traced_memory()[0]
+  return gc.mem_alloc()
+
+
+def bench(name, decoder, times):
+  for i, t in enumerate(times):
+    decoder._times[i] = t
+  results = []
+  decoder.callback = lambda cmd, addr, ext: results.append(cmd)
+  decoder.error_function(lambda code: results.append(code))
+  # First run records the result, then the callback does nothing
+  decoder.edge = len(times)
+  decoder.decode(None)
+  decoder.callback = lambda cmd, addr, ext: None
+  decoder.error_function(lambda code: None)
+  t0 = ticks_us()
+  for _ in range(_RUNS):
+    decoder.edge = len(times)
+    decoder.decode(None)
+  dt = ticks_diff(ticks_us(), t0)
+  # Heap measured in a second run (tracemalloc slows the decoding down)
+  gc.collect()
+  if tracemalloc:
+    tracemalloc.start()
+  runs = 0
+  m0 = mem_alloc()
+  while runs < _RUNS:
+    decoder.edge = len(times)
+    decoder.decode(None)
+    runs += 1
+  allocated = mem_alloc() - m0
+  if tracemalloc:
+    tracemalloc.stop()
+  print('%-14s result %4d  %7.1f us/decode  %6.1f bytes allocated/decode' % (
+    name, results[0], dt / _RUNS, allocated / _RUNS))
+
+
+nec8 = NEC_8(Pin(0), None)
+nec16 = NEC_16(Pin(1), None)
+bench('NEC_8 data', nec8, nec_frame(0x10, 0x45))
+bench('NEC_8 repeat', nec8, repeat_frame())
+bench('NEC_8 bad data', nec8, bad_data_frame())
+bench('NEC_16 data', nec16, nec_frame(0x7F, 0x18))
+bench('bad start', nec8, [1000, 2000, 3000, 4000])
@@ -0,0 +1,50 @@
+# Decoding throughput of the IR decoders on recorded bursts (see
+# remote_control/stm32_ir_recorder.py), replayed on a PC through the whole
+# receive path (edge interrupt, block timer, decode) by host/ir_replay.py.
+# Without a recording, synthetic NEC bursts are used:
+#   python benchmarks/bench_ir_replay.py [ir.bin]   (from the repository root)
+
+import sys
+sys.path.insert(0, 'host')
+from time import perf_counter
+from ir_replay import read_bursts, replay, make_decoder
+
+_RUNS = 50
+
+
+def nec_burst(addr, cmd):
+  times = [0, 9000, 13500]
+  t = times[-1]
+  word = addr | ((addr ^ 0xff) << 8) | (cmd << 16) | ((cmd ^ 0xff) << 24)
+  for i in range(32):
+    t += 563
+    times.append(t)
+    t += 1688 if (word >> i) & 1 else 563
+    times.append(t)
+  times.append(t + 563)
+  return times
+
+
+def synthetic_bursts():
+  bursts = []
+  for cmd in range(16):
+    bursts.append(nec_burst(0x10, cmd))
+    bursts.append([0, 9000, 11250, 11810])  # Repeat
+  return bursts
+
+
+if len(sys.argv) > 1:
+  with open(sys.argv[1], 'rb') as f:
+    bursts = read_bursts(f.read())
+else:
+  bursts = synthetic_bursts()
+
+for name in ('NEC_8', 'NEC_16', 'IR_AUTO'):
+  ir = make_decoder(name)
+  results = replay(ir, bursts)
+  t0 = perf_counter()
+  for _ in range(_RUNS):
+    replay(ir, bursts)
+  dt = perf_counter() - t0
+  decoded = sum(1 for r in results if not isinstance(r, int))
+  print('%-8s %4d bursts %4d decoded %8.0f bursts/s' % (name, len(bursts), decoded, _RUNS * len(bursts) / dt))
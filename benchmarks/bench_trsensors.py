@@ -0,0 +1,71 @@
+# Line sensor (TLC1543 ADC) acquisition rate of stm32_TRsensors, bit-banged
+# from Python and with the SoftSPI transport, compared with the former read
+# (one CS window and a 100us wait per channel). On the board
+# the sensors of the AlphaBot2 are read; on a PC the pins are connected to the
+# simulated ADC of host/tlc1543.py, which also checks the framing:
+# On a PC the SoftSPI stand-in is written in Python, on the board it is C.
+#   python benchmarks/bench_trsensors.py   (from the repository root)
+
+import sys
+sys.path.insert(0, 'host')
+sys.path.append('alphabot')
+import utime
+from array import array
+try:
+  from tlc1543 import TLC1543
+  adc = TLC1543([101, 202, 303, 404, 505])
+except ImportError:
+  adc = None # On the board
+from stm32_TRsensors import TRSensors
+
+_RUNS = 200
+
+
+# Former TRSensors.analogRead
+def legacy_read(sensors):
+  value = [0]* (sensors._numSensors+1)
+  for j in range(0, sensors._numSensors+1):
+    sensors._cs.off()
+    for i in range(0,4):
+      if (j >> (3 - i)) & 0x01:
+        sensors._addr.on()
+      else:
+        sensors._addr.off()
+      value[j] <<= 1
+      if sensors._dout.value():
+        value[j] |= 0x01
+      sensors._clk.on()
+      sensors._clk.off()
+    for i in range(0, sensors._numSensors+1):
+      value[j] <<= 1
+      if sensors._dout.value():
+        value[j] |= 0x01
+      sensors._clk.on()
+      sensors._clk.off()
+    utime.sleep_us(100)
+    sensors._cs.on()
+  return value[1:]
+
+
+def bench(name, read):
+  values = read()
+  t0 = utime.ticks_us()
+  for _ in range(_RUNS):
+    read()
+  dt = utime.ticks_diff(utime.ticks_us(), t0)
+  print('%-12s %8.0f reads/s  %s' % (name, _RUNS * 1000000 / dt, values))
+
+
+sensors = TRSensors()
+bench('former', lambda: legacy_read(sensors))
+bench('pipelined', sensors.analogRead)
+spi_sensors = TRSensors(spi=True)
+bench('softspi', spi_sensors.analogRead)
+# Calibration and line position, integer only
+spi_sensors.setCalibration([0] * 5, [1023] * 5)
+calibrated = array('H', [0] * 5)
+bench('readLine', spi_sensors.readLine)
+bench('readLineInto', lambda: spi_sensors.readLineInto(calibrated))
+if adc:
+  # 6 per frame with the 16-clock SPI frames, none when bit-banged
+  print('clocks ignored during conversions:', adc.ignored_clocks)
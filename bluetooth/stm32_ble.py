@@ -1,88 +1,23 @@
 from micropython import const
-import struct
 import bluetooth
-
-# Advertising payloads are repeated packets of the following form:
-#   1 byte data length (N + 1)
-#   1 byte type (see constants below)
-#   N bytes type-specific data
-
-_ADV_TYPE_FLAGS = const(0x01)
-_ADV_TYPE_NAME = const(0x09)
-_ADV_TYPE_UUID16_COMPLETE = const(0x3)
-_ADV_TYPE_UUID32_COMPLETE = const(0x5)
-_ADV_TYPE_UUID128_COMPLETE = const(0x7)
-_ADV_TYPE_UUID16_MORE = const(0x2)
-_ADV_TYPE_UUID32_MORE = const(0x4)
-_ADV_TYPE_UUID128_MORE = const(0x6)
-_ADV_TYPE_APPEARANCE = const(0x19)
-
-_IRQ_CENTRAL_CONNECT = const(1 << 0)
-_IRQ_CENTRAL_DISCONNECT = const(1 << 1)
-_IRQ_GATTS_WRITE = const(1 << 2)
+from stm32_ble_ringbuf import RingBuffer
+from stm32_ble_notify import NotifyQueue
+from stm32_ble_advpolicy import AdvertisingPolicy
+# Advertising payload codec, decode_* are re-exported for existing users of this module
+from stm32_bleAdvertising import adv_payloads, decode_field, decode_name, decode_services
+from stm32_bleAdvertising import adv_payload as advertising_payload
+
+_IRQ_CENTRAL_CONNECT = const(1)
+_IRQ_CENTRAL_DISCONNECT = const(2)
+_IRQ_GATTS_WRITE = const(3)
+_IRQ_MTU_EXCHANGED = const(21)
 
 # org.bluetooth.characteristic.gap.appearance.xml
 _ADV_APPEARANCE_GENERIC_COMPUTER = const(128)
 
 
-# Generate a payload to be passed to gap_advertise(adv_data=...).
-def advertising_payload(limited_disc=False, br_edr=False, name=None, services=None, appearance=0):
-  payload = bytearray()
-
-  def _append(adv_type, value):
-    nonlocal payload
-    payload += struct.pack('BB', len(value) + 1, adv_type) + value
-
-  _append(_ADV_TYPE_FLAGS, struct.pack(
-    'B', (0x01 if limited_disc else 0x02) + (0x00 if br_edr else 0x04)))
-
-  if name:
-    _append(_ADV_TYPE_NAME, name)
-
-  if services:
-    for uuid in services:
-      b = bytes(uuid)
-      if len(b) == 2:
-        _append(_ADV_TYPE_UUID16_COMPLETE, b)
-      elif len(b) == 4:
-        _append(_ADV_TYPE_UUID32_COMPLETE, b)
-      elif len(b) == 16:
-        _append(_ADV_TYPE_UUID128_COMPLETE, b)
-
-  # See org.bluetooth.characteristic.gap.appearance.xml
-  _append(_ADV_TYPE_APPEARANCE, struct.pack('<h', appearance))
-
-  return payload
-
-
-def decode_field(payload, adv_type):
-  i = 0
-  result = []
-  while i + 1 < len(payload):
-    if payload[i + 1] == adv_type:
-      result.append(payload[i + 2:i + payload[i] + 1])
-    i += 1 + payload[i]
-  return result
-
-
-def decode_name(payload):
-  n = decode_field(payload, _ADV_TYPE_NAME)
-  return str(n[0], 'utf-8') if n else ''
-
-
-def decode_services(payload):
-  services = []
-  for u in decode_field(payload, _ADV_TYPE_UUID16_COMPLETE):
-    services.append(bluetooth.UUID(struct.unpack('<h', u)[0]))
-  for u in decode_field(payload, _ADV_TYPE_UUID32_COMPLETE):
-    services.append(bluetooth.UUID(struct.unpack('<d', u)[0]))
-  for u in decode_field(payload, _ADV_TYPE_UUID128_COMPLETE):
-    services.append(bluetooth.UUID(u))
-  return services
-
-
 class BlueUart:
-  def __init__(self, name, UUID_UART, UUID_TX, UUID_RX, rxbuf=100):
+  def __init__(self, name, UUID_UART, UUID_TX, UUID_RX, rxbuf=100, ringbuf=256, txbuf=512, adv_policy=None):
 
     _UART_UUID = bluetooth.UUID(UUID_UART,)
     _UART_TX = (bluetooth.UUID(UUID_TX), bluetooth.FLAG_NOTIFY,)
@@ -97,11 +32,18 @@ class BlueUart:
     # Increase the size of the rx buffer and enable append mode.
     self._ble.gatts_set_buffer(self._rx_handle, rxbuf, True)
     self._connections = set()
-    self._rx_buffer = bytearray()
+    # Received bytes are queued in a fixed-size ring buffer (no allocation in _irq)
+    self._rx_buffer = RingBuffer(ringbuf)
+    # Per connection TX queues, sent in (MTU - 3) byte notifications round-robin
+    self._tx_queue = NotifyQueue(self._ble, self._tx_handle, txbuf)
     self._handler = None
     # Optionally add services=[_UART_UUID], but this is likely to make the payload too large.
-    self._payload = advertising_payload(
+    # Fields that do not fit in the 31 bytes advertising payload go to the scan response.
+    self._payload, self._resp_payload = adv_payloads(
       name=name, appearance=_ADV_APPEARANCE_GENERIC_COMPUTER)
+    # Fast advertising after boot and disconnections, then stepped back-off
+    self._adv_policy = adv_policy or AdvertisingPolicy()
+    self._adv_policy.bind(self._gap_advertise)
     self._advertise()
 
   def irq(self, handler):
@@ -112,37 +54,73 @@ class BlueUart:
     if event == _IRQ_CENTRAL_CONNECT:
       conn_handle, _, _, = data
       self._connections.add(conn_handle)
+      self._tx_queue.add(conn_handle)
+      self._adv_policy.connected()
     elif event == _IRQ_CENTRAL_DISCONNECT:
       conn_handle, _, _, = data
       if conn_handle in self._connections:
         self._connections.remove(conn_handle)
+      self._tx_queue.remove(conn_handle)
       # Start advertising again to allow a new connection.
       self._advertise()
     elif event == _IRQ_GATTS_WRITE:
       conn_handle, value_handle, = data
       if conn_handle in self._connections and value_handle == self._rx_handle:
-        self._rx_buffer += self._ble.gatts_read(self._rx_handle)
+        self._rx_buffer.put(self._ble.gatts_read(self._rx_handle))
         if self._handler:
           self._handler()
+    elif event == _IRQ_MTU_EXCHANGED:
+      conn_handle, mtu, = data
+      # Applied by the next write()/flush(), the queue is never drained from the IRQ
+      self._tx_queue.set_mtu(conn_handle, mtu)
 
   def any(self):
-    return len(self._rx_buffer)
+    return self._rx_buffer.any()
 
   def read(self, sz=None):
-    if not sz:
-      sz = len(self._rx_buffer)
-    result = self._rx_buffer[0:sz]
-    self._rx_buffer = self._rx_buffer[sz:]
-    return result
+    return self._rx_buffer.read(sz)
 
-  def write(self, data):
-    for conn_handle in self._connections:
-      self._ble.gatts_notify(conn_handle, self._tx_handle, data)
+  def readinto(self, buf, nbytes=None):
+    return self._rx_buffer.readinto(buf, nbytes)
+
+  # Returns a complete line (ending with b'\n') or None, or the buffered bytes
+  # when the ring buffer is full without a line end
+  def readline(self):
+    return self._rx_buffer.readline()
+
+  # Number of received bytes lost because the ring buffer was full
+  def overflows(self):
+    return self._rx_buffer.overflows
+
+  # Queues data for all connections, or only conn_handle if given.
+  # Returns the number of bytes accepted (see NotifyQueue.write).
+  def write(self, data, conn_handle=None):
+    return self._tx_queue.write(data, conn_handle)
+
+  # Sends queued data, returns the number of bytes still waiting
+  def flush(self):
+    return self._tx_queue.drain()
+
+  # Bytes that can be written without drops for any connection
+  def txfree(self):
+    return self._tx_queue.free()
+
+  # Returns (bytes sent, bytes queued, bytes dropped) of a connection
+  def stats(self, conn_handle):
+    return self._tx_queue.stats(conn_handle)
 
   def close(self):
     for conn_handle in self._connections:
       self._ble.gap_disconnect(conn_handle)
     self._connections.clear()
+    self._tx_queue.clear()
+
+  # Resumes fast advertising, e.g. on a user event
+  def advertise_fast(self):
+    self._adv_policy.kick()
+
+  def _advertise(self):
+    self._adv_policy.start()
 
-  def _advertise(self, interval_us=500000):
-    self._ble.gap_advertise(interval_us, adv_data=self._payload)
+  def _gap_advertise(self, interval_us):
+    self._ble.gap_advertise(interval_us, adv_data=self._payload, resp_data=self._resp_payload)
@@ -1,4 +1,5 @@
-# Exemple pour générer des trames d'advertising pour le BLE
+# Encodage et décodage des trames d'advertising pour le BLE
+# (module partagé par stm32_ble.py, stm32_ble_uart.py et stm32_ble_sensor.py)
 
 from micropython import const
 import struct
@@ -20,72 +21,134 @@ _ADV_TYPE_UUID128_MORE = const(0x6)
 _ADV_TYPE_APPEARANCE = const(0x19)
 _ADV_TYPE_MANUFACTURER = const(0xFF)
 
-# Génère une trame qui sera passée à la méthode gap_advertise(adv_data=...).
+# Taille maximale d'une trame d'advertising (et d'une trame de réponse au scan)
+_ADV_MAX_PAYLOAD = const(31)
 
 
-def adv_payload(
+# Ecrit le champ (longueur, type, valeur) à la position pos de buf, retourne la position suivante
+def _put_field(buf, pos, adv_type, value):
+  buf[pos] = len(value) + 1
+  buf[pos + 1] = adv_type
+  buf[pos + 2 : pos + 2 + len(value)] = value
+  return pos + 2 + len(value)
+
+
+# Génère les trames passées à la méthode gap_advertise(adv_data=..., resp_data=...).
+# Les champs sont écrits dans buf (bytearray de 62 octets, réutilisable entre deux appels).
+# Les champs qui ne tiennent pas dans les 31 octets de la trame d'advertising sont
+# placés dans la trame de réponse au scan.
+# Retourne (adv_data, resp_data), resp_data vaut None si elle est vide.
+def adv_payloads(
   limited_disc=False,
   br_edr=False,
   name=None,
   services=None,
   appearance=0,
   manufacturer=0,
+  buf=None,
 ):
-  payload = bytearray()
-
-  def _append(adv_type, value):
-    nonlocal payload
-    payload += struct.pack("BB", len(value) + 1, adv_type) + value
-
-  _append(
-    _ADV_TYPE_FLAGS,
-    struct.pack("B", (0x01 if limited_disc else 0x02) + (0x00 if br_edr else 0x04)),
-  )
-
+  if buf is None:
+    buf = bytearray(2 * _ADV_MAX_PAYLOAD)
+  fields = []
   if name:
-    _append(_ADV_TYPE_NAME, name)
-
+    fields.append((_ADV_TYPE_NAME, name.encode() if isinstance(name, str) else name))
   if services:
     for uuid in services:
       b = bytes(uuid)
       if len(b) == 2:
-        _append(_ADV_TYPE_UUID16_COMPLETE, b)
+        fields.append((_ADV_TYPE_UUID16_COMPLETE, b))
       elif len(b) == 4:
-        _append(_ADV_TYPE_UUID32_COMPLETE, b)
+        fields.append((_ADV_TYPE_UUID32_COMPLETE, b))
       elif len(b) == 16:
-        _append(_ADV_TYPE_UUID128_COMPLETE, b)
-
+        fields.append((_ADV_TYPE_UUID128_COMPLETE, b))
   if appearance:
     # Voir org.bluetooth.characteristic.gap.appearance.xml
-    _append(_ADV_TYPE_APPEARANCE, struct.pack("<h", appearance))
-
+    fields.append((_ADV_TYPE_APPEARANCE, struct.pack("<h", appearance)))
   if manufacturer:
-    _append(_ADV_TYPE_MANUFACTURER, manufacturer)
+    fields.append((_ADV_TYPE_MANUFACTURER, manufacturer))
 
+  adv = _put_field(
+    buf, 0,
+    _ADV_TYPE_FLAGS,
+    struct.pack("B", (0x01 if limited_disc else 0x02) + (0x00 if br_edr else 0x04)),
+  )
+  resp = _ADV_MAX_PAYLOAD
+  for adv_type, value in fields:
+    size = len(value) + 2
+    if adv + size <= _ADV_MAX_PAYLOAD:
+      adv = _put_field(buf, adv, adv_type, value)
+    elif resp + size <= 2 * _ADV_MAX_PAYLOAD:
+      resp = _put_field(buf, resp, adv_type, value)
+    else:
+      raise ValueError("advertising payload too large")
+
+  mv = memoryview(buf)
+  return mv[0:adv], (mv[_ADV_MAX_PAYLOAD:resp] if resp > _ADV_MAX_PAYLOAD else None)
+
+
+# Génère une trame unique contenant tous les champs (trame d'advertising suivie de la
+# trame de réponse au scan), conservée pour compatibilité.
+def adv_payload(
+  limited_disc=False,
+  br_edr=False,
+  name=None,
+  services=None,
+  appearance=0,
+  manufacturer=0,
+):
+  adv_data, resp_data = adv_payloads(limited_disc, br_edr, name, services, appearance, manufacturer)
+  payload = bytearray(adv_data)
+  if resp_data:
+    payload += resp_data
   return payload
 
 
-def decode_field(payload, adv_type):
+# Parcourt la trame une seule fois et retourne l'index de ses champs sous la forme
+# d'une liste de tuples (type, position des données, longueur des données).
+def adv_index(payload):
+  index = []
   i = 0
+  n = len(payload)
+  while i + 1 < n:
+    length = payload[i]
+    if length == 0 or i + 1 + length > n:
+      # Octets de bourrage ou champ tronqué
+      break
+    index.append((payload[i + 1], i + 2, length - 1))
+    i += 1 + length
+  return index
+
+
+# Retourne les données des champs de type adv_type, sans copie (memoryview)
+def decode_field(payload, adv_type, index=None):
+  if index is None:
+    index = adv_index(payload)
+  mv = memoryview(payload)
   result = []
-  while i + 1 < len(payload):
-    if payload[i + 1] == adv_type:
-      result.append(payload[i + 2 : i + payload[i] + 1])
-      i += 1 + payload[i]
-      return result
+  for field_type, offset, length in index:
+    if field_type == adv_type:
+      result.append(mv[offset : offset + length])
+  return result
 
 
-def decode_name(payload):
-  n = decode_field(payload, _ADV_TYPE_NAME)
+def decode_name(payload, index=None):
+  n = decode_field(payload, _ADV_TYPE_NAME, index)
   return str(n[0], "utf-8") if n else ""
 
 
-def decode_services(payload):
+def decode_services(payload, index=None):
+  if index is None:
+    index = adv_index(payload)
+  mv = memoryview(payload)
   services = []
-  for u in decode_field(payload, _ADV_TYPE_UUID16_COMPLETE):
-    services.append(bluetooth.UUID(struct.unpack("<h", u)[0]))
-  for u in decode_field(payload, _ADV_TYPE_UUID32_COMPLETE):
-    services.append(bluetooth.UUID(struct.unpack("<d", u)[0]))
-  for u in decode_field(payload, _ADV_TYPE_UUID128_COMPLETE):
-    services.append(bluetooth.UUID(u))
+  for field_type, offset, length in index:
+    if field_type == _ADV_TYPE_UUID16_COMPLETE or field_type == _ADV_TYPE_UUID16_MORE:
+      for i in range(offset, offset + length - 1, 2):
+        services.append(bluetooth.UUID(struct.unpack_from("<H", mv, i)[0]))
+    elif field_type == _ADV_TYPE_UUID32_COMPLETE or field_type == _ADV_TYPE_UUID32_MORE:
+      for i in range(offset, offset + length - 3, 4):
+        services.append(bluetooth.UUID(struct.unpack_from("<I", mv, i)[0]))
+    elif field_type == _ADV_TYPE_UUID128_COMPLETE or field_type == _ADV_TYPE_UUID128_MORE:
+      for i in range(offset, offset + length - 15, 16):
+        services.append(bluetooth.UUID(bytes(mv[i : i + 16])))
   return services
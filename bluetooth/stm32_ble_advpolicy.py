@@ -0,0 +1,84 @@
+# Adaptive advertising interval shared by BlueUart, BLEUART and BLESensor.
+# After boot or a disconnection the device advertises with a short interval
+# so that a central reconnects quickly, then the interval is stepped back to
+# save power on unattended nodes. kick() resumes fast advertising, e.g. on a
+# button press. The time taken by centrals to connect is recorded.
+#
+#   policy = AdvertisingPolicy(steps=((100000, 30000), (500000, 60000), (1000000, 0)))
+#   uart = BLEUART(bluetooth.BLE(), adv_policy=policy)
+
+from machine import Timer
+from utime import ticks_ms, ticks_diff
+
+# (interval in µs, duration in ms) : 100 ms during 30 s, 500 ms during 5 min, then 1 s
+_DEFAULT_STEPS = ((100000, 30000), (500000, 300000), (1000000, 0))
+
+
+class AdvertisingPolicy:
+
+  def __init__(self, steps=_DEFAULT_STEPS):
+    self._steps = steps
+    self._step = 0
+    self._advertise = None # Callback(interval_us) starting the advertising
+    self._timer = Timer(-1)
+    self._advertising = False
+    self._start_ms = 0
+    # Statistics on the time between the start of advertising and a connection
+    self.connections = 0
+    self.last_connect_ms = 0
+    self.total_connect_ms = 0
+    self.max_connect_ms = 0
+
+  # Called by the BLE classes with their gap_advertise wrapper
+  def bind(self, advertise):
+    self._advertise = advertise
+
+  # Current advertising interval in µs
+  def interval_us(self):
+    return self._steps[self._step][0]
+
+  # Starts advertising from the fast interval (after boot or a disconnection)
+  def start(self):
+    if not self._advertising:
+      self._start_ms = ticks_ms()
+    self._advertising = True
+    self._set_step(0)
+
+  # Resumes fast advertising on a user event, ignored while connected
+  def kick(self):
+    if self._advertising and self._step:
+      self._set_step(0)
+
+  # Called when a central connects: the advertising stops
+  def connected(self):
+    self._timer.deinit()
+    if self._advertising:
+      self._advertising = False
+      elapsed = ticks_diff(ticks_ms(), self._start_ms)
+      self.connections += 1
+      self.last_connect_ms = elapsed
+      self.total_connect_ms += elapsed
+      if elapsed > self.max_connect_ms:
+        self.max_connect_ms = elapsed
+
+  def stop(self):
+    self._timer.deinit()
+    self._advertising = False
+
+  # Returns (connections, mean, max, last time to connect in ms)
+  def stats(self):
+    mean = self.total_connect_ms // self.connections if self.connections else 0
+    return (self.connections, mean, self.max_connect_ms, self.last_connect_ms)
+
+  def _set_step(self, step):
+    self._step = step
+    self._timer.deinit()
+    interval_us, duration_ms = self._steps[step]
+    if self._advertise:
+      self._advertise(interval_us)
+    if duration_ms and step + 1 < len(self._steps):
+      self._timer.init(period=duration_ms, mode=Timer.ONE_SHOT, callback=self._next_step)
+
+  def _next_step(self, _):
+    if self._advertising:
+      self._set_step(self._step + 1)
@@ -0,0 +1,115 @@
+# Encodeurs des caractéristiques du protocole Blue-ST (application ST BLE Sensor).
+# Chaque encodeur possède son propre tampon (bytearray) rempli avec struct.pack_into :
+# publier une mesure ne crée pas de nouvel objet bytes.
+# Le tampon est réutilisé à chaque appel de encode(), il doit être envoyé (set_data,
+# publish) avant l'encodage de la mesure suivante.
+# Format d'un paquet : horodatage sur 16 bits (little endian) suivi des valeurs.
+# encode() prend les mesures en unités usuelles (°C, hPa, %) : une mesure flottante
+# crée un float à la mise à l'échelle. encode_raw() prend des entiers déjà dans
+# l'unité transmise (dixièmes de °C, centièmes d'hPa, ...) et n'alloue rien :
+#   encoder.encode(21.5) # ou encoder.encode_raw(215)
+
+from struct import pack_into, calcsize
+from micropython import const
+import bluetooth
+
+# Masques des fonctionnalités Blue-ST (voir le SDK BlueST)
+FEATURE_SWITCH = const(0x20000000)
+FEATURE_PRESSURE = const(0x00100000)
+FEATURE_HUMIDITY = const(0x00080000)
+FEATURE_TEMPERATURE = const(0x00040000)
+FEATURE_ENVIRONMENTAL = const(0x001C0000) # Pression + humidité + température
+
+# Retourne l'UUID de la caractéristique associée au masque d'une fonctionnalité
+def feature_uuid(mask):
+  return bluetooth.UUID('%08x-0001-11e1-ac36-0002a5d5c51b' % mask)
+
+
+class _FeatureEncoder:
+  # fmt : format struct des valeurs, précédé de l'horodatage '<H'
+  def __init__(self, fmt):
+    self._fmt = '<H' + fmt
+    self.buf = bytearray(calcsize(self._fmt))
+    self._timestamp = 0
+
+  # Horodatage : compteur sur 16 bits incrémenté à chaque paquet
+  def _next_timestamp(self):
+    self._timestamp = (self._timestamp + 1) & 0xFFFF
+    return self._timestamp
+
+
+# Température en °C, envoyée en dixièmes de degré
+class TemperatureEncoder(_FeatureEncoder):
+  MASK = FEATURE_TEMPERATURE
+
+  def __init__(self):
+    super().__init__('h')
+
+  def encode(self, temperature):
+    return self.encode_raw(int(temperature * 10))
+
+  # temperature en dixièmes de degré (entier)
+  def encode_raw(self, temperature):
+    pack_into(self._fmt, self.buf, 0, self._next_timestamp(), temperature)
+    return self.buf
+
+
+# Pression en hPa, envoyée en centièmes d'hPa
+class PressureEncoder(_FeatureEncoder):
+  MASK = FEATURE_PRESSURE
+
+  def __init__(self):
+    super().__init__('i')
+
+  def encode(self, pressure):
+    return self.encode_raw(int(pressure * 100))
+
+  # pressure en centièmes d'hPa (entier)
+  def encode_raw(self, pressure):
+    pack_into(self._fmt, self.buf, 0, self._next_timestamp(), pressure)
+    return self.buf
+
+
+# Humidité relative en %, envoyée en dixièmes de %
+class HumidityEncoder(_FeatureEncoder):
+  MASK = FEATURE_HUMIDITY
+
+  def __init__(self):
+    super().__init__('H')
+
+  def encode(self, humidity):
+    return self.encode_raw(int(humidity * 10))
+
+  # humidity en dixièmes de % (entier)
+  def encode_raw(self, humidity):
+    pack_into(self._fmt, self.buf, 0, self._next_timestamp(), humidity)
+    return self.buf
+
+
+# Pression, humidité et température dans une seule caractéristique
+# (ordre des masques décroissants, comme l'attend l'application)
+class EnvironmentalEncoder(_FeatureEncoder):
+  MASK = FEATURE_ENVIRONMENTAL
+
+  def __init__(self):
+    super().__init__('iHh')
+
+  def encode(self, pressure, humidity, temperature):
+    return self.encode_raw(int(pressure * 100), int(humidity * 10), int(temperature * 10))
+
+  # Centièmes d'hPa, dixièmes de % et dixièmes de degré (entiers)
+  def encode_raw(self, pressure, humidity, temperature):
+    pack_into(self._fmt, self.buf, 0, self._next_timestamp(), pressure, humidity, temperature)
+    return self.buf
+
+
+# Etat de l'interrupteur (0 ou 1)
+class SwitchEncoder(_FeatureEncoder):
+  MASK = FEATURE_SWITCH
+
+  def __init__(self):
+    super().__init__('B')
+
+  def encode(self, state):
+    pack_into(self._fmt, self.buf, 0, self._next_timestamp(), state)
+    return self.buf
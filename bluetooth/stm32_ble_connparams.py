@@ -0,0 +1,84 @@
+# Réglage des paramètres de connexion BLE (débit / consommation).
+# Un profil regroupe les valeurs visées :
+#   (intervalle min en µs, intervalle max en µs, latence esclave, timeout de supervision en ms, MTU)
+# A la connexion, le MTU du profil est proposé (config(mtu=...)) puis un échange de
+# MTU est demandé au central. Les valeurs réellement négociées (_IRQ_MTU_EXCHANGED,
+# _IRQ_CONNECTION_UPDATE) sont enregistrées pour chaque connexion.
+# L'API bluetooth de MicroPython ne permet pas à un périphérique de demander un
+# intervalle de connexion ni un PHY : c'est le central qui les choisit, connected_params()
+# et meets() permettent de vérifier si les valeurs obtenues conviennent au profil.
+
+from micropython import const
+
+# Gros transferts (vidage des journaux) : intervalle court, MTU maximal
+PROFILE_BULK = (7500, 15000, 0, 4000, 247)
+# Console interactive : latence faible, paquets moyens
+PROFILE_INTERACTIVE = (15000, 30000, 0, 4000, 128)
+# Capteur autonome : intervalle long, le périphérique peut sauter des évènements de connexion
+PROFILE_LOW_POWER = (100000, 500000, 4, 6000, 23)
+
+_DEFAULT_MTU = const(23)
+_UNKNOWN = const(-1)
+
+
+class ConnectionTuner:
+
+  def __init__(self, ble, profile=PROFILE_INTERACTIVE):
+    self._ble = ble
+    self._params = {} # conn_handle -> [intervalle µs, latence, timeout ms, MTU]
+    self.set_profile(profile)
+
+  def set_profile(self, profile):
+    self.profile = profile
+    try:
+      self._ble.config(mtu=profile[4])
+    except (ValueError, OSError):
+      pass
+    # Les connexions en cours renégocient leur MTU
+    for conn_handle in self._params:
+      self._exchange_mtu(conn_handle)
+
+  # Appelée sur _IRQ_CENTRAL_CONNECT
+  def connected(self, conn_handle):
+    self._params[conn_handle] = [_UNKNOWN, _UNKNOWN, _UNKNOWN, _DEFAULT_MTU]
+    self._exchange_mtu(conn_handle)
+
+  def disconnected(self, conn_handle):
+    if conn_handle in self._params:
+      del self._params[conn_handle]
+
+  # Appelée sur _IRQ_MTU_EXCHANGED
+  def mtu_exchanged(self, conn_handle, mtu):
+    params = self._params.get(conn_handle)
+    if params:
+      params[3] = mtu
+
+  # Appelée sur _IRQ_CONNECTION_UPDATE : intervalle en unités de 1,25 ms, timeout en unités de 10 ms
+  def connection_updated(self, conn_handle, conn_interval, conn_latency, supervision_timeout, status):
+    params = self._params.get(conn_handle)
+    if params and status == 0:
+      params[0] = conn_interval * 1250
+      params[1] = conn_latency
+      params[2] = supervision_timeout * 10
+
+  # Retourne (intervalle µs, latence, timeout ms, MTU) négociés, -1 pour une valeur inconnue
+  def connected_params(self, conn_handle):
+    params = self._params.get(conn_handle)
+    return tuple(params) if params else None
+
+  # Retourne True si les valeurs connues de la connexion respectent le profil
+  def meets(self, conn_handle):
+    params = self._params.get(conn_handle)
+    if not params:
+      return False
+    interval, latency, timeout, mtu = params
+    if interval != _UNKNOWN and not self.profile[0] <= interval <= self.profile[1]:
+      return False
+    return mtu >= self.profile[4]
+
+  def _exchange_mtu(self, conn_handle):
+    if self.profile[4] > _DEFAULT_MTU:
+      try:
+        self._ble.gattc_exchange_mtu(conn_handle)
+      except (AttributeError, OSError):
+        pass # Echange refusé ou non supporté, le MTU par défaut est conservé
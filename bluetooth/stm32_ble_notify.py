@@ -0,0 +1,179 @@
+# MTU-aware notification queue for a notify characteristic (BLE UART TX).
+# Data written by the application is queued per connection in a RingBuffer
+# and sent in chunks of (MTU - 3) bytes, the largest payload of a single
+# notification. When the BLE stack runs out of TX buffers gatts_notify raises
+# OSError: the chunk is kept and sent again on the next drain().
+# MicroPython has no event for a completed notification, so the queue is
+# drained by write() and by the owner's flush() (call it from the main loop or
+# BLEUARTStream.drain() while data is waiting).
+# drain() has a single consumer: the BLE IRQ must not drain the queue, it could
+# land in the middle of a drain() of the application and send a chunk twice.
+# The IRQ only records a new MTU, drain() applies it between two chunks, and a
+# drain() started while another one is running (write() from a receive handler)
+# returns at once.
+# Connections are served round-robin, one chunk each per turn, so a slow
+# central neither delays nor aborts the notifications of the others.
+
+from micropython import const
+from stm32_ble_ringbuf import RingBuffer
+
+# ATT header size (opcode + handle) and default ATT MTU
+_ATT_HEADER = const(3)
+_DEFAULT_MTU = const(23)
+
+
+class _Link:
+  # TX state of one connection
+  def __init__(self, size, mtu):
+    self.ring = RingBuffer(size)
+    self.pending = 0 # Length of the chunk waiting to be notified
+    self.sent = 0 # Bytes notified
+    self.dropped = 0 # Bytes written while the queue was full
+    self.negotiated = mtu # MTU to use from the next chunk on
+    self.set_mtu(mtu)
+
+  def set_mtu(self, mtu):
+    self.mtu = mtu
+    payload = mtu - _ATT_HEADER
+    chunk = bytearray(payload)
+    if self.pending:
+      # Keep the chunk that has not been sent yet
+      chunk[0:self.pending] = self.chunk[0:self.pending]
+    self.chunk = chunk
+    self.view = memoryview(chunk)
+
+
+class NotifyQueue:
+
+  def __init__(self, ble, value_handle, size=512):
+    self._ble = ble
+    self._handle = value_handle
+    self._size = size
+    self._links = {}
+    self._order = [] # Connection handles in round-robin order
+    self._next = 0 # Index in _order of the first connection served by drain()
+    self._draining = False
+
+  def add(self, conn_handle, mtu=_DEFAULT_MTU):
+    if conn_handle not in self._links:
+      self._order.append(conn_handle)
+    self._links[conn_handle] = _Link(self._size, mtu)
+
+  def remove(self, conn_handle):
+    if conn_handle in self._links:
+      del self._links[conn_handle]
+      self._order.remove(conn_handle)
+
+  def clear(self):
+    self._links.clear()
+    self._order.clear()
+
+  # Called on _IRQ_MTU_EXCHANGED (IRQ safe, no allocation): the chunk size is
+  # changed by the next drain()
+  def set_mtu(self, conn_handle, mtu):
+    link = self._links.get(conn_handle)
+    if link:
+      link.negotiated = mtu
+
+  def mtu(self, conn_handle):
+    link = self._links.get(conn_handle)
+    return link.negotiated if link else _DEFAULT_MTU
+
+  # Queues data and starts sending it.
+  # With conn_handle, data is only sent to that connection and the number of bytes
+  # accepted is returned: less than len(data) when its queue is full (back-pressure),
+  # the caller has to write the remaining bytes later.
+  # Without conn_handle, data is queued for every connection independently: bytes
+  # that do not fit in the queue of a slow central are dropped for that central
+  # only (see stats()). The number of bytes queued for all connections is returned.
+  def write(self, data, conn_handle=None):
+    if isinstance(data, str):
+      data = data.encode() # gatts_notify accepted str, the ring buffers only take bytes
+    if conn_handle is not None:
+      link = self._links.get(conn_handle)
+      if link is None:
+        return 0
+      n = min(len(data), link.ring.free())
+      if n:
+        link.ring.put(memoryview(data)[0:n] if n < len(data) else data)
+    elif self._links:
+      n = len(data)
+      for link in self._links.values():
+        k = link.ring.put(data)
+        link.dropped += len(data) - k
+        if k < n:
+          n = k
+    else:
+      return 0
+    self.drain()
+    return n
+
+  # Sends as many queued chunks as the stack accepts, one chunk per connection in turn.
+  # Returns the number of bytes still waiting to be sent.
+  def drain(self):
+    if self._draining:
+      # Write from a handler interrupting a drain() of the application: its data
+      # is sent by the drain() in progress or the next one
+      return self.any()
+    self._draining = True
+    try:
+      self._drain()
+    finally:
+      self._draining = False
+    return self.any()
+
+  def _drain(self):
+    order = self._order
+    count = len(order)
+    active = count # Connections that may still have something to send this call
+    i = self._next
+    blocked = 0 # Bit mask of the connections (index in order) blocked this call
+    while active:
+      if i >= count:
+        i = 0
+      if not (blocked >> i) & 1:
+        conn_handle = order[i]
+        link = self._links[conn_handle]
+        if link.negotiated != link.mtu:
+          link.set_mtu(link.negotiated)
+        if not link.pending:
+          link.pending = link.ring.readinto(link.chunk)
+        if not link.pending:
+          blocked |= 1 << i
+          active -= 1
+        else:
+          try:
+            self._ble.gatts_notify(conn_handle, self._handle, link.view[0:link.pending])
+            link.sent += link.pending
+            link.pending = 0
+          except OSError:
+            # No TX buffer left for this connection, retry on next drain()
+            blocked |= 1 << i
+            active -= 1
+      i += 1
+    # Start the next call with the connection following the last one served
+    self._next = i if i < count else 0
+
+  # Number of bytes waiting to be sent (to conn_handle only if given)
+  def any(self, conn_handle=None):
+    if conn_handle is not None:
+      link = self._links.get(conn_handle)
+      return link.pending + link.ring.any() if link else 0
+    remaining = 0
+    for link in self._links.values():
+      remaining += link.pending + link.ring.any()
+    return remaining
+
+  # Free space in the smallest queue: bytes that can be broadcast without drops
+  def free(self):
+    n = self._size
+    for link in self._links.values():
+      n = min(n, link.ring.free())
+    return n
+
+  # Returns (bytes sent, bytes queued, bytes dropped) of a connection
+  def stats(self, conn_handle):
+    link = self._links.get(conn_handle)
+    if link is None:
+      return (0, 0, 0)
+    return (link.sent, link.pending + link.ring.any(), link.dropped)
@@ -0,0 +1,100 @@
+# Fixed-capacity byte ring buffer for the BLE UART receive path.
+# Single producer (the BLE IRQ handler) / single consumer (the application):
+# the producer only moves the head index and the consumer only moves the tail
+# index, so no locking is needed and put() never allocates.
+
+class RingBuffer:
+
+  def __init__(self, size):
+    # One slot is kept empty to tell a full buffer from an empty one
+    self._size = size + 1
+    self._buf = bytearray(self._size)
+    self._mv = memoryview(self._buf)
+    self._head = 0 # Next byte to write
+    self._tail = 0 # Next byte to read
+    # Number of received bytes dropped because the buffer was full
+    self.overflows = 0
+
+  # Number of bytes waiting to be read
+  def any(self):
+    n = self._head - self._tail
+    if n < 0:
+      n += self._size
+    return n
+
+  # Free space left in the buffer
+  def free(self):
+    return self._size - 1 - self.any()
+
+  # Appends data to the buffer (IRQ safe, no allocation).
+  # Bytes that do not fit are dropped and counted in overflows.
+  # Returns the number of bytes stored.
+  def put(self, data):
+    n = len(data)
+    free = self.free()
+    if n > free:
+      self.overflows += n - free
+      n = free
+    head = self._head
+    if n == len(data) and head + n <= self._size:
+      # Common case: a whole write that does not wrap
+      self._buf[head:head + n] = data
+      head += n
+      if head == self._size:
+        head = 0
+    else:
+      # Wrapping or truncated write: byte copy, slicing data would allocate
+      buf = self._buf
+      size = self._size
+      for i in range(n):
+        buf[head] = data[i]
+        head += 1
+        if head == size:
+          head = 0
+    self._head = head
+    return n
+
+  # Reads up to nbytes (default len(buf)) into buf, returns the number of bytes read
+  def readinto(self, buf, nbytes=None):
+    n = len(buf) if nbytes is None else min(nbytes, len(buf))
+    n = min(n, self.any())
+    tail = self._tail
+    first = min(n, self._size - tail)
+    buf[0:first] = self._mv[tail:tail + first]
+    if n > first:
+      buf[first:n] = self._mv[0:n - first]
+    tail += n
+    if tail >= self._size:
+      tail -= self._size
+    self._tail = tail
+    return n
+
+  # Returns up to sz bytes (all pending bytes by default)
+  def read(self, sz=None):
+    n = self.any()
+    if sz and sz < n:
+      n = sz
+    result = bytearray(n)
+    self.readinto(result)
+    return result
+
+  # Returns a complete line including b'\n', or None if no full line is buffered.
+  # A line longer than the buffer can never be complete: once the buffer is full
+  # without a b'\n', the buffered bytes are returned as a partial line so the
+  # producer can store the rest of it.
+  def readline(self):
+    n = self.any()
+    i = self._tail
+    for count in range(1, n + 1):
+      if self._buf[i] == 0x0A:
+        return self.read(count)
+      i += 1
+      if i == self._size:
+        i = 0
+    if n == self._size - 1:
+      return self.read()
+    return None
+
+  # Drops all pending bytes
+  def clear(self):
+    self._tail = self._head
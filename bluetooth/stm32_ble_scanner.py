@@ -0,0 +1,196 @@
+# Scanner BLE (rôle central) avec élimination des doublons et filtrage.
+# Dans un environnement chargé, le même appareil envoie la même trame
+# d'advertising plusieurs fois par seconde. L'interruption _IRQ_SCAN_RESULT
+# fait donc le minimum, sans allocation :
+#   1 - filtre sur le RSSI,
+#   2 - filtres peu coûteux sur la trame brute (type de champ présent, UUID de service),
+#   3 - élimination des doublons : un petit cache LRU des empreintes
+#       (adresse + trame) déjà vues. Seuls les appareils retenus par les filtres y
+#       entrent, les autres ne peuvent pas en chasser les appareils recherchés,
+#   4 - copie du résultat dans une file préallouée.
+# Le décodage complet (nom, services) n'est fait que par get(), pour les
+# résultats retenus.
+#
+#   scanner = BLEScanner(bluetooth.BLE(), rssi_min=-80, service=bluetooth.UUID(0x181A))
+#   scanner.scan(10000)
+#   while True:
+#     result = scanner.get()
+#     if result:
+#       addr_type, addr, rssi, name, services, adv_data = result
+
+from micropython import const
+from array import array
+from stm32_bleAdvertising import adv_index, decode_name, decode_services
+
+_IRQ_SCAN_RESULT = const(5)
+_IRQ_SCAN_DONE = const(6)
+
+_ADV_TYPE_UUID16_MORE = const(0x2)
+_ADV_TYPE_UUID128_COMPLETE = const(0x7)
+
+# Taille des UUID des champs 0x02 à 0x07
+_UUID_SIZES = b'\x02\x02\x04\x04\x10\x10'
+
+_ADDR_SIZE = const(6)
+_ADV_MAX_PAYLOAD = const(31)
+
+# Masque de l'empreinte : h * 33 + 255 reste un petit entier (< 2**30), sans allocation
+_HASH_MASK = const(0xFFFFFF)
+
+
+class BLEScanner:
+
+  def __init__(self, ble, queue_len=8, cache_len=16, rssi_min=-127, ad_type=None, service=None):
+    self._ble = ble
+    self._ble.active(True)
+    self._ble.irq(self._irq)
+    self.filter(rssi_min, ad_type, service)
+
+    # Cache LRU des empreintes déjà vues
+    self._cache = array('i', [0] * cache_len)
+    self._cache_age = array('i', [0] * cache_len)
+    self._age = 0
+
+    # File des résultats retenus : emplacements préalloués
+    queue_len += 1 # Un emplacement reste libre pour distinguer une file pleine d'une file vide
+    self._queue_len = queue_len
+    self._addr_type = bytearray(queue_len)
+    self._addr = [bytearray(_ADDR_SIZE) for _ in range(queue_len)]
+    self._rssi = array('i', [0] * queue_len)
+    self._adv = [bytearray(_ADV_MAX_PAYLOAD) for _ in range(queue_len)]
+    self._adv_len = bytearray(queue_len)
+    self._head = 0
+    self._tail = 0
+
+    self.scanning = False
+    # Compteurs
+    self.received = 0 # Résultats reçus
+    self.duplicates = 0 # Ignorés car déjà vus récemment
+    self.filtered = 0 # Ignorés par les filtres (RSSI, type de champ, service)
+    self.dropped = 0 # Perdus car la file était pleine
+
+  # Filtres appliqués dans l'interruption :
+  # rssi_min : RSSI minimal (dBm), ad_type : type de champ qui doit être présent,
+  # service : UUID de service qui doit être annoncé
+  def filter(self, rssi_min=-127, ad_type=None, service=None):
+    self._rssi_min = rssi_min
+    self._ad_type = ad_type
+    self._service = bytes(service) if service is not None else None
+
+  # Démarre un scan de duration_ms millisecondes (0 : sans fin)
+  def scan(self, duration_ms=0, interval_us=30000, window_us=30000, active=False):
+    self.clear_cache()
+    self.scanning = True
+    self._ble.gap_scan(duration_ms, interval_us, window_us, active)
+
+  def stop(self):
+    self._ble.gap_scan(None)
+    self.scanning = False
+
+  # Oublie les appareils déjà vus : ils seront de nouveau signalés
+  def clear_cache(self):
+    for i in range(len(self._cache)):
+      self._cache[i] = 0
+      self._cache_age[i] = 0
+
+  # Nombre de résultats en attente
+  def any(self):
+    n = self._head - self._tail
+    return n + self._queue_len if n < 0 else n
+
+  # Retourne le résultat suivant décodé (addr_type, addr, rssi, name, services, adv_data),
+  # ou None si la file est vide
+  def get(self):
+    if self._head == self._tail:
+      return None
+    i = self._tail
+    adv_data = bytes(self._adv[i][0:self._adv_len[i]])
+    result = (self._addr_type[i], bytes(self._addr[i]), self._rssi[i])
+    self._tail = (i + 1) % self._queue_len
+    index = adv_index(adv_data)
+    return result + (decode_name(adv_data, index), decode_services(adv_data, index), adv_data)
+
+  def _irq(self, event, data):
+    if event == _IRQ_SCAN_RESULT:
+      addr_type, addr, adv_type, rssi, adv_data = data
+      self.received += 1
+      if rssi < self._rssi_min:
+        self.filtered += 1
+      elif not self._match(adv_data):
+        self.filtered += 1
+      elif self._seen(addr, adv_data):
+        self.duplicates += 1
+      else:
+        self._push(addr_type, addr, rssi, adv_data)
+    elif event == _IRQ_SCAN_DONE:
+      self.scanning = False
+
+  # Retourne True si l'empreinte de (addr, adv_data) est dans le cache, sinon l'y ajoute
+  # à la place de la plus ancienne
+  def _seen(self, addr, adv_data):
+    h = 5381 # djb2
+    for b in addr:
+      h = ((h * 33) ^ b) & _HASH_MASK
+    for b in adv_data:
+      h = ((h * 33) ^ b) & _HASH_MASK
+    h |= 1 # 0 marque un emplacement libre
+    cache = self._cache
+    ages = self._cache_age
+    self._age += 1
+    oldest = 0
+    for i in range(len(cache)):
+      if cache[i] == h:
+        ages[i] = self._age
+        return True
+      if ages[i] < ages[oldest]:
+        oldest = i
+    cache[oldest] = h
+    ages[oldest] = self._age
+    return False
+
+  # Filtres sur la trame brute, sans décodage
+  def _match(self, adv_data):
+    if self._ad_type is None and self._service is None:
+      return True
+    type_found = self._ad_type is None
+    service_found = self._service is None
+    service = self._service
+    i = 0
+    n = len(adv_data)
+    while i + 1 < n:
+      length = adv_data[i]
+      if length == 0 or i + 1 + length > n:
+        break
+      field_type = adv_data[i + 1]
+      if field_type == self._ad_type:
+        type_found = True
+      if not service_found and _ADV_TYPE_UUID16_MORE <= field_type <= _ADV_TYPE_UUID128_COMPLETE:
+        # Les UUID de 2, 4 et 16 octets sont dans les champs 0x02-0x03, 0x04-0x05 et 0x06-0x07
+        size = len(service)
+        if _UUID_SIZES[field_type - _ADV_TYPE_UUID16_MORE] == size:
+          j = i + 2
+          end = i + 1 + length
+          while j + size <= end:
+            k = 0
+            while k < size and adv_data[j + k] == service[k]:
+              k += 1
+            if k == size:
+              service_found = True
+              break
+            j += size
+      i += 1 + length
+    return type_found and service_found
+
+  def _push(self, addr_type, addr, rssi, adv_data):
+    i = self._head
+    nxt = (i + 1) % self._queue_len
+    if nxt == self._tail:
+      self.dropped += 1
+      return
+    self._addr_type[i] = addr_type
+    self._addr[i][0:_ADDR_SIZE] = addr
+    self._rssi[i] = rssi
+    n = min(len(adv_data), _ADV_MAX_PAYLOAD)
+    self._adv[i][0:n] = adv_data[0:n] if n < len(adv_data) else adv_data
+    self._adv_len[i] = n
+    self._head = nxt
@@ -1,52 +1,145 @@
 import bluetooth
-from stm32_bleAdvertising import adv_payload # Pour gérer l'advertising GAP
+from stm32_bleAdvertising import adv_payloads # Pour gérer l'advertising GAP
 from struct import pack # Pour agréger les octets envoyés par les trames BLE
+from stm32_ble_bluest import SwitchEncoder # Paquets Blue-ST préalloués
+from stm32_ble_advpolicy import AdvertisingPolicy # Intervalle d'advertising adaptatif
+from stm32_ble_connparams import ConnectionTuner, PROFILE_LOW_POWER # Paramètres de connexion
 from micropython import const
-import pyb # Pour gérer les LED
+import micropython
+from machine import Timer # Pour cadencer l'envoi des notifications
+from utime import ticks_ms, ticks_diff
 
 # Constantes définies pour le protocole Blue-ST
 _IRQ_CENTRAL_CONNECT    = const(1)
 _IRQ_CENTRAL_DISCONNECT = const(2) 
 _IRQ_GATTS_WRITE        = const(3)
+_IRQ_MTU_EXCHANGED      = const(21)
+_IRQ_CONNECTION_UPDATE  = const(27)
 
 # Indique que l'on va communiquer avec une appli conforme au protocole Blue-ST :
 _ST_APP_UUID = bluetooth.UUID('00000000-0001-11E1-AC36-0002A5D5C51B')
 
-# Initialisation des LED
-led_red = pyb.LED(3)
-led_green = pyb.LED(2)
+# Indicateur d'état utilisant les LED de la carte (rouge : advertising,
+# verte : connecté), utilisé par défaut. Les LED ne sont initialisées qu'au premier
+# changement d'état (et non plus à l'import du module).
+#   sensor = BLESensor(ble, services, mask) # LEDStatus() par défaut
+#   sensor = BLESensor(ble, services, mask, status=None) # Sans indicateur
+# Tout objet ayant les méthodes advertising() et connected() peut le remplacer.
+class LEDStatus:
+  def __init__(self, red=3, green=2):
+    self._ids = (red, green)
+    self._red = None
+    self._green = None
+
+  def _init(self):
+    import pyb
+    self._red = pyb.LED(self._ids[0])
+    self._green = pyb.LED(self._ids[1])
+
+  def advertising(self):
+    if self._red is None:
+      self._init()
+    self._red.on()
+    self._green.off()
+
+  def connected(self):
+    if self._red is None:
+      self._init()
+    self._red.off()
+    self._green.on()
+
+# Valeur par défaut du paramètre status de BLESensor : un LEDStatus()
+_LED_STATUS = object()
 
 # 2 - Construction de la trame (contenu du message) d'avertising GAP
 _PROTOCOL_VERSION = const(0x01) # Version du protocole
 _DEVICE_ID = const(0x80) # Carte NUCLEO générique
 _DEVICE_MAC = [0x12, 0x34, 0x56, 0x78, 0x9A, 0xBC] # Adresse matérielle MAC fictive
 
+# Fréquence maximale de notification par défaut d'une caractéristique (en Hz)
+_DEFAULT_NOTIFY_RATE = const(10)
+# Taille de l'horodatage placé en tête des paquets Blue-ST
+_TIMESTAMP_SIZE = const(2)
+
+# Caractéristique gérée par l'ordonnanceur de notifications :
+# seule la dernière valeur publiée pendant un intervalle est envoyée.
+class _NotifySlot:
+  def __init__(self, interval_ms):
+    self.interval_ms = interval_ms
+    self.value = bytearray() # Dernière valeur publiée
+    self.sent = bytearray() # Dernière valeur notifiée
+    self.pending = False # Une valeur publiée n'a pas encore été envoyée
+    self.last_ms = ticks_ms()
+    self.notified = 0 # Nombre de notifications envoyées
+    self.merged = 0 # Valeurs remplacées par une plus récente avant leur envoi
+    self.dropped = 0 # Valeurs ignorées car identiques à la dernière valeur notifiée
+    self.errors = 0 # Envois refusés par la pile BLE (OSError), retentés au tick suivant
+
+# Compare deux paquets Blue-ST sans leur horodatage (incrémenté à chaque encode()),
+# sans allocation
+def _same_value(sent, package):
+  n = len(package)
+  if len(sent) != n:
+    return False
+  for i in range(_TIMESTAMP_SIZE, n):
+    if sent[i] != package[i]:
+      return False
+  return True
+
 class BLESensor:
   # # UUID d'une caractéristique de température
   # _DEFAULT_TEMPERATURE_UUID = (bluetooth.UUID('00040000-0001-11e1-ac36-0002a5d5c51b'), bluetooth.FLAG_NOTIFY)
   # _DEFAULT_FEATURE_MASK = const(2**18)
 
   # Initialisation, démarrage de GAP et publication radio des trames d'advertising
-  def __init__(self, ble, services, mask):
+  def __init__(self, ble, services, mask, rate_hz=_DEFAULT_NOTIFY_RATE, adv_policy=None, profile=PROFILE_LOW_POWER, status=_LED_STATUS):
     self._services = services
 
     # Trame d'avertising : concaténation des informations avec la fonction Micropython "pack" 
     # La chaîne '>BBI6B' désigne le format des arguments, voir la documention de pack ici : https://docs.python.org/3/library/struct.html
     self._MANUFACTURER = pack('>BBI6B', _PROTOCOL_VERSION, _DEVICE_ID, mask, *_DEVICE_MAC)
 
+    # La radio n'est activée qu'au premier appel de init_service()
     self._ble = ble
-    self._ble.active(True)
-    self._ble.irq(self._irq)
+    self._status = LEDStatus() if status is _LED_STATUS else status
 
     self._connections = None
     self._payload = None
+    self._resp_payload = None
     self._handler = None
+    # Caractéristiques modifiables par le central : handle -> (fonction, différée)
+    self._write_handlers = {}
+    self._dispatch_ref = self._dispatch # Evite une allocation à chaque écriture
+    self.write_overruns = 0 # Ecritures perdues car la file de micropython.schedule était pleine
+    # Caractéristique SWITCH (fixée par registerCallback) et paquet de réponse préalloué
+    self._switch_handle = None
+    self._switch = SwitchEncoder()
+    self._switch_callback = None
+    # Advertising rapide au démarrage et après une déconnexion, puis de plus en plus espacé
+    self._adv_policy = adv_policy or AdvertisingPolicy()
+    self._adv_policy.bind(self._gap_advertise)
+    # MTU proposé et paramètres négociés (voir stm32_ble_connparams), créé avec la radio
+    self._profile = profile
+    self._tuner = None
+
+    # Ordonnanceur de notifications (voir publish())
+    self._rate_hz = rate_hz
+    self._slots = {}
+    self._timer = None
+    self._update_ref = self._scheduled_update # Evite une allocation à chaque tick
 
   def init_service(self, registerCallback, name='WB55-MPY'):
+    if self._tuner is None:
+      # Activation de la radio à la première utilisation
+      self._ble.active(True)
+      self._ble.irq(self._irq)
+      self._tuner = ConnectionTuner(self._ble, self._profile)
     self._ST_APP_SERVICE = (_ST_APP_UUID, self._services)
     registerCallback(self)
+    if self._switch_handle is not None and self._switch_handle not in self._write_handlers:
+      self.register_write(self._switch_handle, self._on_switch)
     self._connections = set()
-    self._payload = adv_payload(name=name, manufacturer=self._MANUFACTURER)
+    self._payload, self._resp_payload = adv_payloads(name=name, manufacturer=self._MANUFACTURER)
     self._advertise()
     self._handler = None
 
@@ -57,34 +150,91 @@ class BLESensor:
       conn_handle, _, _, = data
       # Se connecte au central (et arrête automatiquement l'advertising)
       self._connections.add(conn_handle)
-      led_red.off()
-      led_green.on()
+      self._adv_policy.connected()
+      self._tuner.connected(conn_handle)
+      if self._status:
+        self._status.connected()
 
     # Si le central a envoyé une demande de déconnexion
     elif event == _IRQ_CENTRAL_DISCONNECT:
       conn_handle, _, _, = data
       self._connections.remove(conn_handle)
+      self._tuner.disconnected(conn_handle)
       # Relance l'advertising pour permettre de nouvelles connexions
       self._advertise()
-      led_red.on()
-      led_green.off()
 
-		# Si une écriture est détectée dans la caractéristique SWITCH (interrupteur) de la LED
+    # Si le central écrit dans une caractéristique : recherche de sa fonction dans le registre
     elif event == _IRQ_GATTS_WRITE:
       conn_handle, value_handle, = data
-      if self._switch_handle:
-        if conn_handle in self._connections and value_handle == self._switch_handle:
-				  # Lecture de la valeur de la caractéristique
-          data_received = self._ble.gatts_read(self._switch_handle)
-          self._ble.gatts_write(self._switch_handle, pack('<HB', 1000, data_received[0]))
-          self._ble.gatts_notify(conn_handle, self._switch_handle)
-          # Selon la valeur écrite, on allume ou on éteint la LED rouge
-          if data_received[0] == 1:
-            pass # callback .on()
-          else:
-            pass # callback .off()
+      entry = self._write_handlers.get(value_handle)
+      if entry and conn_handle in self._connections:
+        handler, deferred = entry
+        if deferred:
+          # Le traitement est fait hors interruption, (conn_handle, value_handle) est passé
+          # sous la forme d'un entier pour ne rien allouer
+          try:
+            micropython.schedule(self._dispatch_ref, (conn_handle << 16) | value_handle)
+          except RuntimeError:
+            self.write_overruns += 1
+        else:
+          handler(conn_handle, value_handle, self._ble.gatts_read(value_handle))
+
+    # Le MTU a été négocié
+    elif event == _IRQ_MTU_EXCHANGED:
+      conn_handle, mtu = data
+      self._tuner.mtu_exchanged(conn_handle, mtu)
+
+    # Le central a modifié les paramètres de la connexion
+    elif event == _IRQ_CONNECTION_UPDATE:
+      conn_handle, conn_interval, conn_latency, supervision_timeout, status = data
+      self._tuner.connection_updated(conn_handle, conn_interval, conn_latency, supervision_timeout, status)
+
+  # Choisit un profil de connexion (PROFILE_BULK, PROFILE_INTERACTIVE, PROFILE_LOW_POWER)
+  def set_profile(self, profile):
+    self._profile = profile
+    if self._tuner:
+      self._tuner.set_profile(profile)
+
+  # Retourne (intervalle µs, latence, timeout ms, MTU) négociés avec un central
+  def connection_params(self, conn_handle):
+    return self._tuner.connected_params(conn_handle) if self._tuner else None
+
+  # Enregistre la fonction handler(conn_handle, value_handle, value) appelée lorsque le
+  # central écrit dans la caractéristique value_handle. Par défaut elle est appelée hors
+  # interruption (micropython.schedule) ; deferred=False l'appelle dans l'interruption,
+  # elle doit alors être très courte et ne rien allouer.
+  def register_write(self, value_handle, handler, deferred=True):
+    self._write_handlers[value_handle] = (handler, deferred)
+
+  def unregister_write(self, value_handle):
+    if value_handle in self._write_handlers:
+      del self._write_handlers[value_handle]
+
+  # Fonction callback(state) appelée à chaque écriture dans la caractéristique SWITCH
+  def on_switch(self, callback):
+    self._switch_callback = callback
+
+  def _dispatch(self, arg):
+    conn_handle = arg >> 16
+    value_handle = arg & 0xFFFF
+    entry = self._write_handlers.get(value_handle)
+    if entry:
+      entry[0](conn_handle, value_handle, self._ble.gatts_read(value_handle))
+
+  # Ecriture dans la caractéristique SWITCH (interrupteur) de la LED
+  def _on_switch(self, conn_handle, value_handle, value):
+    if not value: # Ecriture vide : rien à commuter
+      return
+    state = value[0]
+    self._ble.gatts_write(value_handle, self._switch.encode(state))
+    if conn_handle in self._connections:
+      self._ble.gatts_notify(conn_handle, value_handle)
+    # Selon la valeur écrite, l'application allume ou éteint la LED
+    if self._switch_callback:
+      self._switch_callback(state)
 
   # On écrit, dans la caractéristique "temperature", le timestamp (horodatage) et la valeur de la température
+  # (package peut être le tampon d'un encodeur de stm32_ble_bluest)
   def set_data(self, package, data_handle, notify=1):
     self._ble.gatts_write(data_handle, package)
     if notify:
@@ -92,8 +242,98 @@ class BLESensor:
         # Signale au Central (le smartphone) que la caractéristique vient d'être écrite et peut être lue
         self._ble.gatts_notify(conn_handle, data_handle)
 
-  # Démarre l'advertising avec une période de 5 secondes, précise qu'un central pourra se connecter au périphérique
-  def _advertise(self, interval_us=500000):
-    self._ble.gap_advertise(interval_us, adv_data=self._payload, connectable=True)
-    led_red.on()
-    led_green.off()
+  # Fixe la fréquence maximale de notification (en Hz) d'une caractéristique publiée
+  # avec publish(). rate_hz=0 supprime la limite.
+  def set_rate(self, data_handle, rate_hz):
+    interval_ms = 1000 // rate_hz if rate_hz else 0
+    slot = self._slots.get(data_handle)
+    if slot is None:
+      self._slots[data_handle] = _NotifySlot(interval_ms)
+    else:
+      slot.interval_ms = interval_ms
+
+  # Publie une valeur sans limite de fréquence : elle est envoyée par update() au plus
+  # une fois par intervalle, seule la dernière valeur publiée est conservée et une
+  # valeur identique à la dernière notifiée (horodatage excepté) n'est pas renvoyée.
+  def publish(self, package, data_handle):
+    slot = self._slots.get(data_handle)
+    if slot is None:
+      self.set_rate(data_handle, self._rate_hz)
+      slot = self._slots[data_handle]
+    if slot.pending:
+      slot.merged += 1
+    elif _same_value(slot.sent, package):
+      slot.dropped += 1
+      return
+    if len(slot.value) == len(package):
+      slot.value[:] = package
+    else:
+      slot.value = bytearray(package)
+    slot.pending = True
+
+  # Envoie les valeurs publiées dont l'intervalle est écoulé, retourne le nombre de
+  # caractéristiques notifiées. A appeler dans la boucle principale ou via start().
+  # Une valeur refusée par la pile BLE (OSError, par exemple ENOMEM lorsque la file
+  # de notifications du contrôleur est pleine) reste en attente jusqu'au tick suivant.
+  def update(self):
+    now = ticks_ms()
+    count = 0
+    for data_handle, slot in self._slots.items():
+      if slot.pending and ticks_diff(now, slot.last_ms) >= slot.interval_ms:
+        try:
+          self.set_data(slot.value, data_handle)
+        except OSError:
+          slot.errors += 1
+          continue
+        if len(slot.sent) == len(slot.value):
+          slot.sent[:] = slot.value
+        else:
+          slot.sent = bytearray(slot.value)
+        slot.pending = False
+        slot.last_ms = now
+        slot.notified += 1
+        count += 1
+    return count
+
+  # Retourne (notifications envoyées, valeurs fusionnées, valeurs ignorées, envois
+  # refusés par la pile BLE) d'une caractéristique
+  def stats(self, data_handle):
+    slot = self._slots.get(data_handle)
+    if slot is None:
+      return (0, 0, 0, 0)
+    return (slot.notified, slot.merged, slot.dropped, slot.errors)
+
+  # Appelle update() toutes les period_ms millisecondes à l'aide d'un timer logiciel
+  def start(self, period_ms=20):
+    self.stop()
+    self._timer = Timer(-1)
+    self._timer.init(period=period_ms, mode=Timer.PERIODIC, callback=self._tick)
+
+  def stop(self):
+    if self._timer:
+      self._timer.deinit()
+      self._timer = None
+
+  def _tick(self, _):
+    try:
+      micropython.schedule(self._update_ref, None)
+    except RuntimeError:
+      pass # File d'attente de schedule pleine, la valeur partira au prochain tick
+
+  def _scheduled_update(self, _):
+    self.update()
+
+  # Relance l'advertising rapide, par exemple sur un appui bouton
+  def advertise_fast(self):
+    self._adv_policy.kick()
+
+  # Démarre l'advertising (intervalle court puis de plus en plus long, voir AdvertisingPolicy),
+  # précise qu'un central pourra se connecter au périphérique
+  def _advertise(self):
+    self._adv_policy.start()
+    if self._status:
+      self._status.advertising()
+
+  # Appelée par la politique d'advertising à chaque changement d'intervalle
+  def _gap_advertise(self, interval_us):
+    self._ble.gap_advertise(interval_us, adv_data=self._payload, resp_data=self._resp_payload, connectable=True)
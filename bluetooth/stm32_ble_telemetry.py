@@ -0,0 +1,131 @@
+# Binary framing of sensor time series for the BLE UART.
+# Samples are integer tuples (one value per channel, e.g. temperature in
+# tenths of degree, humidity, CO2 ppm...). Each frame carries up to
+# samples_per_frame samples: the first one as is, the others as differences
+# with the previous sample, all written as zigzag varints (1 byte for a
+# difference between -64 and 63). A CRC-16/CCITT protects the frame, which is
+# COBS encoded and terminated by a 0x00 byte so that a receiver can resync at
+# any time. Buffers are allocated once, in the constructor.
+#
+# Frame before COBS encoding:
+#   sequence number (1 byte), number of channels (1 byte), number of samples (1 byte)
+#   first sample: <channels> varints, then <samples - 1> x <channels> delta varints
+#   CRC-16/CCITT of the above (2 bytes, little endian)
+#
+#   encoder = TelemetryEncoder(channels=3)
+#   frame = encoder.add(values) # values: array('i') or list of 3 ints
+#   if frame:
+#     uart.write(frame)
+#
+# host/telemetry_decoder.py decodes these frames on a PC.
+
+from micropython import const
+from array import array
+
+_HEADER_SIZE = const(3)
+_CRC_SIZE = const(2)
+_VARINT_MAX = const(5) # Bytes of a 32-bit zigzag varint
+
+
+def _crc_table():
+  table = array('H', [0] * 256)
+  for i in range(256):
+    crc = i << 8
+    for _ in range(8):
+      crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+    table[i] = crc & 0xFFFF
+  return table
+
+_CRC_TABLE = _crc_table()
+
+
+# CRC-16/CCITT-FALSE of buf[0:n]
+def crc16(buf, n):
+  crc = 0xFFFF
+  table = _CRC_TABLE
+  for i in range(n):
+    crc = ((crc << 8) & 0xFF00) ^ table[(crc >> 8) ^ buf[i]]
+  return crc
+
+
+class TelemetryEncoder:
+
+  def __init__(self, channels, samples_per_frame=16):
+    self._channels = channels
+    self._samples_per_frame = samples_per_frame
+    raw_size = _HEADER_SIZE + channels * samples_per_frame * _VARINT_MAX + _CRC_SIZE
+    self._raw = bytearray(raw_size)
+    # COBS adds one byte every 254 bytes plus one, and the 0x00 delimiter
+    self._frame = bytearray(raw_size + raw_size // 254 + 2)
+    self._frame_mv = memoryview(self._frame)
+    self._previous = array('i', [0] * channels)
+    self._seq = 0
+    self._count = 0
+    self._pos = _HEADER_SIZE
+    self.frames = 0 # Frames produced
+
+  # Appends a sample, returns a memoryview of the encoded frame when the frame is
+  # full, None otherwise. The frame is valid until the next call to add() or flush().
+  def add(self, values):
+    previous = self._previous
+    pos = self._pos
+    raw = self._raw
+    first = not self._count
+    for i in range(self._channels):
+      value = values[i]
+      delta = value if first else value - previous[i]
+      previous[i] = value
+      # Zigzag encoding: small negative and positive numbers give small unsigned numbers
+      delta = (delta << 1) if delta >= 0 else ((-delta) << 1) - 1
+      while delta > 0x7F:
+        raw[pos] = (delta & 0x7F) | 0x80
+        delta >>= 7
+        pos += 1
+      raw[pos] = delta
+      pos += 1
+    self._pos = pos
+    self._count += 1
+    if self._count == self._samples_per_frame:
+      return self.flush()
+    return None
+
+  # Encodes the pending samples into a frame, returns its memoryview (None if no sample)
+  def flush(self):
+    if not self._count:
+      return None
+    raw = self._raw
+    raw[0] = self._seq
+    raw[1] = self._channels
+    raw[2] = self._count
+    pos = self._pos
+    crc = crc16(raw, pos)
+    raw[pos] = crc & 0xFF
+    raw[pos + 1] = crc >> 8
+    n = self._cobs(pos + _CRC_SIZE)
+    self._seq = (self._seq + 1) & 0xFF
+    self._count = 0
+    self._pos = _HEADER_SIZE
+    self.frames += 1
+    return self._frame_mv[0:n]
+
+  # COBS encodes raw[0:n] into _frame followed by 0x00, returns the frame length
+  def _cobs(self, n):
+    raw = self._raw
+    frame = self._frame
+    code_pos = 0
+    code = 1
+    out = 1
+    for i in range(n):
+      b = raw[i]
+      if b:
+        frame[out] = b
+        out += 1
+        code += 1
+      if not b or code == 0xFF:
+        frame[code_pos] = code
+        code_pos = out
+        out += 1
+        code = 1
+    frame[code_pos] = code
+    frame[out] = 0
+    return out + 1
@@ -4,13 +4,20 @@
 # 	https://github.com/micropython/micropython/blob/master/examples/bluetooth/ble_uart_peripheral.py
 # Attente active, envoi de l'adresse MAC et réception continue de chaines de caractères
 import bluetooth # Classes "primitives du BLE"
-from stm32_bleAdvertising import adv_payload # Pour construire la trame d'advertising
+from micropython import const
+from stm32_bleAdvertising import adv_payloads # Pour construire les trames d'advertising
 from binascii import hexlify # Convertit une donnée binaire en sa représentation hexadécimale
+from stm32_ble_ringbuf import RingBuffer # Tampon circulaire de réception
+from stm32_ble_notify import NotifyQueue # File d'envoi découpée à la taille du MTU
+from stm32_ble_advpolicy import AdvertisingPolicy # Intervalle d'advertising adaptatif
+from stm32_ble_connparams import ConnectionTuner, PROFILE_INTERACTIVE # Paramètres de connexion
 
 # Constantes requises pour construire le service BLE UART
 _IRQ_CENTRAL_CONNECT = const(1)
 _IRQ_CENTRAL_DISCONNECT = const(2)
 _IRQ_GATTS_WRITE = const(3)
+_IRQ_MTU_EXCHANGED = const(21)
+_IRQ_CONNECTION_UPDATE = const(27)
 _FLAG_WRITE = const(0x0008)
 _FLAG_NOTIFY = const(0x0010)
 
@@ -36,12 +43,18 @@ _ADV_APPEARANCE_GENERIC_COMPUTER = const(128)
 # Nombre maximum d'octets qui peuvent être échangés par la caractéristique RX
 _MAX_NB_BYTES = const(100)
 
+# Taille du tampon circulaire dans lequel sont accumulés les octets reçus
+_RING_NB_BYTES = const(256)
+
+# Taille de la file d'envoi de chaque connexion
+_TX_NB_BYTES = const(512)
+
 ascii_mac = None
 
 class BLEUART:
 
   # Initialisations
-  def __init__(self, ble, name="WB55-UART", rxbuf=_MAX_NB_BYTES):
+  def __init__(self, ble, name="WB55-UART", rxbuf=_MAX_NB_BYTES, ringbuf=_RING_NB_BYTES, txbuf=_TX_NB_BYTES, adv_policy=None, profile=PROFILE_INTERACTIVE):
     self._ble = ble
     self._ble.active(True)
     self._ble.irq(self._irq)
@@ -50,11 +63,20 @@ class BLEUART:
     # Augmente la taille du tampon rx et active le mode "append"
     self._ble.gatts_set_buffer(self._rx_handle, rxbuf, True)
     self._connections = set()
-    self._rx_buffer = bytearray()
+    # Tampon circulaire de taille fixe : aucune allocation dans _irq
+    self._rx_buffer = RingBuffer(ringbuf)
+    # Les envois sont découpés en paquets de (MTU - 3) octets et mis en file par connexion
+    self._tx_queue = NotifyQueue(self._ble, self._tx_handle, txbuf)
+    # MTU proposé et paramètres négociés (voir stm32_ble_connparams)
+    self._tuner = ConnectionTuner(self._ble, profile)
     self._handler = None
     # Advertising du service :
     # On peut ajouter en option services=[_UART_UUID], mais cela risque de rendre la payload de la caractéristique trop longue
-    self._payload = adv_payload(name=name, appearance=_ADV_APPEARANCE_GENERIC_COMPUTER)
+    # Les champs qui dépassent 31 octets sont placés dans la trame de réponse au scan
+    self._payload, self._resp_payload = adv_payloads(name=name, appearance=_ADV_APPEARANCE_GENERIC_COMPUTER)
+    # Advertising rapide au démarrage et après une déconnexion, puis de plus en plus espacé
+    self._adv_policy = adv_policy or AdvertisingPolicy()
+    self._adv_policy.bind(self._gap_advertise)
     self._advertise()
 
     # Affiche l'adresse MAC de l'objet
@@ -74,11 +96,16 @@ class BLEUART:
     if event == _IRQ_CENTRAL_CONNECT:
       conn_handle, _, _ = data
       self._connections.add(conn_handle)
+      self._tx_queue.add(conn_handle)
+      self._adv_policy.connected()
+      self._tuner.connected(conn_handle)
     # Si un central se déconnecte
     elif event == _IRQ_CENTRAL_DISCONNECT:
       conn_handle, _, _ = data
       if conn_handle in self._connections:
         self._connections.remove(conn_handle)
+      self._tx_queue.remove(conn_handle)
+      self._tuner.disconnected(conn_handle)
       # Redémarre l'advertising pour permettre de nouvelles connexions
       self._advertise()
     # Lorsqu'un client écrit dans une caractéristique exposée par le serveur
@@ -86,33 +113,90 @@ class BLEUART:
     elif event == _IRQ_GATTS_WRITE:
       conn_handle, value_handle = data
       if conn_handle in self._connections and value_handle == self._rx_handle:
-        self._rx_buffer += self._ble.gatts_read(self._rx_handle)
+        self._rx_buffer.put(self._ble.gatts_read(self._rx_handle))
         if self._handler:
           self._handler()
+    # Le MTU a été négocié : la taille des paquets est adaptée au prochain envoi
+    # (write() ou flush(), la file n'est jamais vidée depuis l'interruption)
+    elif event == _IRQ_MTU_EXCHANGED:
+      conn_handle, mtu = data
+      self._tuner.mtu_exchanged(conn_handle, mtu)
+      self._tx_queue.set_mtu(conn_handle, mtu)
+    # Le central a modifié les paramètres de la connexion
+    elif event == _IRQ_CONNECTION_UPDATE:
+      conn_handle, conn_interval, conn_latency, supervision_timeout, status = data
+      self._tuner.connection_updated(conn_handle, conn_interval, conn_latency, supervision_timeout, status)
 
   # Appelée pour vérifier s'il y a des messages en attente de lecture dans RX
   def any(self):
-    return len(self._rx_buffer)
+    return self._rx_buffer.any()
 
   # Retourne les catactères reçus dans RX
   def read(self, sz=None):
-    if not sz:
-      sz = len(self._rx_buffer)
-    result = self._rx_buffer[0:sz]
-    self._rx_buffer = self._rx_buffer[sz:]
-    return result
-
-  # Ecrit dans TX un message à l'attention du central
-  def write(self, data):
-    for conn_handle in self._connections:
-      self._ble.gatts_notify(conn_handle, self._tx_handle, data)
+    return self._rx_buffer.read(sz)
+
+  # Copie les caractères reçus dans buf, retourne le nombre d'octets copiés
+  def readinto(self, buf, nbytes=None):
+    return self._rx_buffer.readinto(buf, nbytes)
+
+  # Retourne une ligne complète (terminée par b'\n') ou None, ou le contenu du tampon
+  # de réception lorsqu'il est plein sans fin de ligne
+  def readline(self):
+    return self._rx_buffer.readline()
+
+  # Nombre d'octets reçus perdus car le tampon circulaire était plein
+  def overflows(self):
+    return self._rx_buffer.overflows
+
+  # Ecrit dans TX un message à l'attention des centraux connectés, ou du seul
+  # central conn_handle s'il est précisé.
+  # Chaque connexion a sa propre file d'envoi, vidée à tour de rôle : un central lent
+  # ne retarde pas les autres. Pour un envoi à tous les centraux, les octets qui ne
+  # tiennent pas dans la file d'un central sont perdus pour ce central (voir stats()).
+  # Retourne le nombre d'octets acceptés : s'il est inférieur à len(data), une file
+  # d'envoi est pleine et le reste devra être écrit plus tard.
+  def write(self, data, conn_handle=None):
+    return self._tx_queue.write(data, conn_handle)
+
+  # Retourne True si au moins un central est connecté
+  def is_connected(self):
+    return len(self._connections) > 0
+
+  # Envoie les données en attente, retourne le nombre d'octets restant à envoyer
+  def flush(self):
+    return self._tx_queue.drain()
+
+  # Nombre d'octets pouvant être écrits sans perte pour aucun des centraux
+  def txfree(self):
+    return self._tx_queue.free()
+
+  # Retourne (octets envoyés, octets en attente, octets perdus) pour une connexion
+  def stats(self, conn_handle):
+    return self._tx_queue.stats(conn_handle)
+
+  # Choisit un profil de connexion (PROFILE_BULK, PROFILE_INTERACTIVE, PROFILE_LOW_POWER)
+  def set_profile(self, profile):
+    self._tuner.set_profile(profile)
+
+  # Retourne (intervalle µs, latence, timeout ms, MTU) négociés avec un central
+  def connection_params(self, conn_handle):
+    return self._tuner.connected_params(conn_handle)
 
   # Mets fin à la connexion au port série simulé
   def close(self):
     for conn_handle in self._connections:
       self._ble.gap_disconnect(conn_handle)
     self._connections.clear()
+    self._tx_queue.clear()
+
+  # Relance l'advertising rapide, par exemple sur un appui bouton
+  def advertise_fast(self):
+    self._adv_policy.kick()
 
   # Pour démarrer l'advertising, précise qu'un central pourra se connecter au périphérique
-  def _advertise(self, interval_us=500000):
-    self._ble.gap_advertise(interval_us, adv_data=self._payload, connectable = True)
+  def _advertise(self):
+    self._adv_policy.start()
+
+  # Appelée par la politique d'advertising à chaque changement d'intervalle
+  def _gap_advertise(self, interval_us):
+    self._ble.gap_advertise(interval_us, adv_data=self._payload, resp_data=self._resp_payload, connectable = True)
@@ -0,0 +1,73 @@
+# Interface asyncio du service UART BLE (stm32_ble_uart.BLEUART).
+# La réception est signalée par l'interruption GATTS_WRITE de BLEUART à travers un
+# ThreadSafeFlag : les tâches en attente de données sont réveillées sans scrutation
+# et peuvent cohabiter avec d'autres tâches (mesures, LoRa, ...).
+#
+#   uart = BLEUART(bluetooth.BLE())
+#   stream = BLEUARTStream(uart)
+#   async def console():
+#     while True:
+#       line = await stream.readline()
+#       await stream.write(b'> ' + line)
+
+import uasyncio as asyncio
+
+# Période de relance de l'envoi lorsque la file d'envoi est pleine (en ms)
+_POLL_MS = 20
+
+class BLEUARTStream:
+
+  def __init__(self, uart, poll_ms=_POLL_MS):
+    self._uart = uart
+    self._poll_ms = poll_ms
+    self._flag = asyncio.ThreadSafeFlag()
+    # Appelé par BLEUART._irq à chaque réception
+    uart.irq(self._flag.set)
+
+  # Attend des données et retourne au plus n octets (tous les octets reçus par défaut)
+  async def read(self, n=-1):
+    while not self._uart.any():
+      await self._flag.wait()
+    return self._uart.read(n if n > 0 else None)
+
+  # Attend des données et les copie dans buf, retourne le nombre d'octets copiés
+  async def readinto(self, buf):
+    while not self._uart.any():
+      await self._flag.wait()
+    return self._uart.readinto(buf)
+
+  # Attend et retourne une ligne complète (terminée par b'\n'). Une ligne plus longue
+  # que le tampon de réception est retournée par morceaux, sans b'\n' sauf le dernier
+  async def readline(self):
+    while True:
+      line = self._uart.readline()
+      if line is not None:
+        return line
+      await self._flag.wait()
+
+  # Met data en file d'envoi sans perte : attend que la file de chaque central
+  # connecté ait assez de place. Retourne le nombre d'octets mis en file, inférieur
+  # à len(data) si aucun central n'est (ou n'est plus) connecté.
+  async def write(self, data):
+    if isinstance(data, str):
+      data = data.encode()
+    mv = memoryview(data)
+    sent = 0
+    while sent < len(data):
+      if not self._uart.is_connected():
+        break
+      n = min(len(data) - sent, self._uart.txfree())
+      if n:
+        sent += self._uart.write(mv[sent:sent + n])
+      if sent < len(data):
+        await asyncio.sleep_ms(self._poll_ms)
+    return sent
+
+  # Attend que toutes les données en file soient envoyées
+  async def drain(self):
+    while self._uart.flush():
+      await asyncio.sleep_ms(self._poll_ms)
+
+  def close(self):
+    self._uart.irq(None)
+    self._uart.close()
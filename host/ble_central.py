@@ -0,0 +1,95 @@
+# Scriptable BLE central (and advertiser, for scanner tests) for the host
+# stand-in of the "bluetooth" module.
+# A Central connects to the BLE() singleton, writes characteristics and
+# receives notifications; every action injects the IRQ the board would get.
+#
+#   central = Central(mtu=247)
+#   central.run([
+#     (0, 'connect'),
+#     (0, 'exchange_mtu'),
+#     (7500, 'write', rx_handle, b'hello\n'),
+#     (100000, 'disconnect'),
+#   ])
+
+import time
+import bluetooth
+
+_DEFAULT_MTU = 23
+
+
+class Central:
+
+  def __init__(self, conn_handle=64, mtu=_DEFAULT_MTU, addr=b'\xc0\xff\xee\x00\x00\x01', ble=None):
+    self.ble = ble or bluetooth.BLE()
+    self.conn_handle = conn_handle
+    self.addr = addr
+    self.mtu = _DEFAULT_MTU # Becomes the negotiated MTU after exchange_mtu()
+    self.preferred_mtu = mtu
+    self.connected = False
+    self.notifications = [] # (value_handle, bytes) received, see keep_notifications
+    self.keep_notifications = True
+    self.notified_bytes = 0
+    self.on_notify = None # Optional callback(value_handle, data)
+
+  def connect(self):
+    self.connected = True
+    self.ble._connect(self)
+
+  def disconnect(self):
+    if self.connected:
+      self.connected = False
+      self.ble._disconnect(self)
+
+  def exchange_mtu(self, mtu=None):
+    self.ble._mtu_exchanged(self, mtu or self.preferred_mtu)
+
+  # Changes the connection parameters (interval in µs, supervision timeout in ms)
+  def update_connection(self, interval_us, latency=0, timeout_ms=4000):
+    self.ble._connection_update(self, interval_us // 1250, latency, timeout_ms // 10)
+
+  def write(self, value_handle, data):
+    self.ble._write(self, value_handle, data)
+
+  # Gives notification credits back to the server, as a connection event would
+  def tick(self, credits=4):
+    if self.ble.tx_credits is not None:
+      self.ble.tx_credits += credits
+
+  # Runs a list of (delay_us, action, *args) steps, action being a method name
+  # of this class or a callable. Delays are real time, 0 runs immediately.
+  def run(self, steps):
+    for step in steps:
+      delay_us, action, args = step[0], step[1], step[2:]
+      if delay_us:
+        time.sleep(delay_us / 1000000)
+      if callable(action):
+        action(*args)
+      else:
+        getattr(self, action)(*args)
+
+  # Called by bluetooth.BLE.gatts_notify
+  def _notified(self, value_handle, data):
+    self.notified_bytes += len(data)
+    if self.keep_notifications:
+      self.notifications.append((value_handle, data))
+    if self.on_notify:
+      self.on_notify(value_handle, data)
+
+  # Returns the concatenation of the notifications received on value_handle
+  def received(self, value_handle):
+    return b''.join(data for handle, data in self.notifications if handle == value_handle)
+
+
+# Remote peripheral seen by a scanning BLE(): every advertise() call injects
+# an _IRQ_SCAN_RESULT while BLE.gap_scan() is running.
+class Advertiser:
+
+  def __init__(self, addr, adv_data, addr_type=0, ble=None):
+    self.ble = ble or bluetooth.BLE()
+    self.addr = bytes(addr)
+    self.addr_type = addr_type
+    self.adv_data = bytes(adv_data)
+
+  # adv_type: 0 connectable advertising, 4 scan response
+  def advertise(self, rssi=-60, adv_type=0):
+    self.ble._scan_result(self.addr_type, self.addr, adv_type, rssi, self.adv_data)
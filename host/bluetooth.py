@@ -0,0 +1,255 @@
+# Host (CPython) stand-in for the MicroPython "bluetooth" module.
+# The GATT server keeps characteristic values in memory, notifications are
+# delivered to the connected ble_central.Central objects and IRQs are injected
+# by those centrals. Statistics on IRQ handler time are kept in BLE.stats.
+
+import time
+
+FLAG_READ = 0x0002
+FLAG_WRITE_NO_RESPONSE = 0x0004
+FLAG_WRITE = 0x0008
+FLAG_NOTIFY = 0x0010
+FLAG_INDICATE = 0x0020
+
+_IRQ_CENTRAL_CONNECT = 1
+_IRQ_CENTRAL_DISCONNECT = 2
+_IRQ_GATTS_WRITE = 3
+_IRQ_SCAN_RESULT = 5
+_IRQ_SCAN_DONE = 6
+_IRQ_MTU_EXCHANGED = 21
+_IRQ_CONNECTION_UPDATE = 27
+
+_ENOTCONN = 107
+_ENOMEM = 12
+_EINVAL = 22
+
+_ADV_MAX_PAYLOAD = 31
+_DEFAULT_MTU = 23
+
+
+class UUID:
+  def __init__(self, value):
+    if isinstance(value, int):
+      self._bytes = value.to_bytes(2 if value <= 0xFFFF else 4, 'little')
+    elif isinstance(value, str):
+      self._bytes = bytes(reversed(bytes.fromhex(value.replace('-', ''))))
+    else:
+      self._bytes = bytes(value)
+    if len(self._bytes) not in (2, 4, 16):
+      raise ValueError('invalid UUID')
+
+  def __bytes__(self):
+    return self._bytes
+
+  def __eq__(self, other):
+    return isinstance(other, UUID) and self._bytes == other._bytes
+
+  def __hash__(self):
+    return hash(self._bytes)
+
+  def __repr__(self):
+    if len(self._bytes) <= 4:
+      return 'UUID(0x%x)' % int.from_bytes(self._bytes, 'little')
+    h = bytes(reversed(self._bytes)).hex()
+    return "UUID('%s-%s-%s-%s-%s')" % (h[0:8], h[8:12], h[12:16], h[16:20], h[20:32])
+
+
+class BLEStats:
+  def __init__(self):
+    self.reset()
+
+  def reset(self):
+    self.irq_count = 0
+    self.irq_time_s = 0.0
+    self.irq_max_s = 0.0
+    self.notifications = 0
+    self.notified_bytes = 0
+    self.notify_errors = 0
+    self.truncated = 0
+    self.advertise_calls = 0
+
+
+class BLE:
+  _instance = None
+
+  # As on the board, BLE() always returns the same object
+  def __new__(cls):
+    if cls._instance is None:
+      cls._instance = super().__new__(cls)
+      cls._instance._reset()
+    return cls._instance
+
+  def __init__(self):
+    pass
+
+  # Forgets all the state, to start a new scenario from scratch
+  @classmethod
+  def reset(cls):
+    cls._instance = None
+
+  def _reset(self):
+    self._active = False
+    self._handler = None
+    self._next_handle = 1
+    self._values = {}
+    self._append = set()
+    self._centrals = {}
+    self._mtu = _DEFAULT_MTU
+    self._mac = bytes((0x02, 0x80, 0xE1, 0x00, 0x00, 0x01))
+    # Number of notifications accepted before gatts_notify raises OSError(ENOMEM),
+    # None for no limit. Centrals give credits back with Central.tick().
+    self.tx_credits = None
+    self.advertising = None
+    self.scanning = None
+    self.stats = BLEStats()
+
+  def active(self, state=None):
+    if state is None:
+      return self._active
+    self._active = bool(state)
+    return self._active
+
+  def config(self, *args, **kwargs):
+    if args:
+      if args[0] == 'mac':
+        return (0, self._mac)
+      if args[0] == 'mtu':
+        return self._mtu
+      raise ValueError('unknown config param')
+    if 'mtu' in kwargs:
+      self._mtu = kwargs['mtu']
+
+  def irq(self, handler):
+    self._handler = handler
+
+  # Calls the registered IRQ handler and records its run time
+  def _irq(self, event, data):
+    if not self._handler:
+      return None
+    t0 = time.perf_counter()
+    result = self._handler(event, data)
+    dt = time.perf_counter() - t0
+    self.stats.irq_count += 1
+    self.stats.irq_time_s += dt
+    if dt > self.stats.irq_max_s:
+      self.stats.irq_max_s = dt
+    return result
+
+  def gap_advertise(self, interval_us, adv_data=None, resp_data=None, connectable=True):
+    if adv_data is not None and len(adv_data) > _ADV_MAX_PAYLOAD:
+      raise OSError(_EINVAL)
+    if resp_data is not None and len(resp_data) > _ADV_MAX_PAYLOAD:
+      raise OSError(_EINVAL)
+    self.stats.advertise_calls += 1
+    if interval_us is None:
+      self.advertising = None
+    else:
+      self.advertising = (interval_us, adv_data and bytes(adv_data),
+        resp_data and bytes(resp_data), connectable)
+
+  def gap_scan(self, duration_ms, interval_us=1280000, window_us=11250, active=False):
+    if duration_ms is None:
+      if self.scanning is not None:
+        self.scanning = None
+        self._irq(_IRQ_SCAN_DONE, ())
+    else:
+      self.scanning = (duration_ms, interval_us, window_us, active)
+
+  # Called by ble_central.Advertiser while scanning. As on the board, addr and
+  # adv_data are passed as memoryviews only valid during the IRQ.
+  def _scan_result(self, addr_type, addr, adv_type, rssi, adv_data):
+    if self.scanning is not None:
+      self._irq(_IRQ_SCAN_RESULT, (addr_type, memoryview(addr), adv_type, rssi, memoryview(adv_data)))
+
+  def gap_disconnect(self, conn_handle):
+    central = self._centrals.get(conn_handle)
+    if central is None:
+      return False
+    central.disconnect()
+    return True
+
+  def gatts_register_services(self, services):
+    result = []
+    for uuid, characteristics in services:
+      self._next_handle += 1 # Service declaration
+      handles = []
+      for characteristic in characteristics:
+        self._next_handle += 1 # Characteristic declaration
+        handles.append(self._next_handle)
+        self._values[self._next_handle] = b''
+        self._next_handle += 1
+        if len(characteristic) > 2:
+          for _ in characteristic[2]:
+            handles.append(self._next_handle)
+            self._values[self._next_handle] = b''
+            self._next_handle += 1
+      result.append(tuple(handles))
+    return tuple(result)
+
+  def gatts_set_buffer(self, value_handle, len, append=False):
+    if append:
+      self._append.add(value_handle)
+    else:
+      self._append.discard(value_handle)
+
+  def gatts_read(self, value_handle):
+    value = self._values[value_handle]
+    if value_handle in self._append:
+      # In append mode reading the value clears it
+      self._values[value_handle] = b''
+    return value
+
+  def gatts_write(self, value_handle, data, send_update=False):
+    self._values[value_handle] = bytes(data)
+    if send_update:
+      for conn_handle in self._centrals:
+        self.gatts_notify(conn_handle, value_handle)
+
+  def gatts_notify(self, conn_handle, value_handle, data=None):
+    central = self._centrals.get(conn_handle)
+    if central is None:
+      raise OSError(_ENOTCONN)
+    if self.tx_credits is not None:
+      if self.tx_credits <= 0:
+        self.stats.notify_errors += 1
+        raise OSError(_ENOMEM)
+      self.tx_credits -= 1
+    value = self._values[value_handle] if data is None else bytes(data)
+    payload = central.mtu - 3
+    if len(value) > payload:
+      # The stack only sends the first (MTU - 3) bytes
+      self.stats.truncated += 1
+      value = value[:payload]
+    self.stats.notifications += 1
+    self.stats.notified_bytes += len(value)
+    central._notified(value_handle, value)
+
+  def gattc_exchange_mtu(self, conn_handle):
+    central = self._centrals.get(conn_handle)
+    if central is None:
+      raise OSError(_ENOTCONN)
+    central.exchange_mtu()
+
+  # Called by ble_central.Central
+  def _connect(self, central):
+    self._centrals[central.conn_handle] = central
+    self.advertising = None
+    self._irq(_IRQ_CENTRAL_CONNECT, (central.conn_handle, 0, central.addr))
+
+  def _disconnect(self, central):
+    if self._centrals.pop(central.conn_handle, None) is not None:
+      self._irq(_IRQ_CENTRAL_DISCONNECT, (central.conn_handle, 0, central.addr))
+
+  def _write(self, central, value_handle, data):
+    if value_handle in self._append:
+      self._values[value_handle] += bytes(data)
+    else:
+      self._values[value_handle] = bytes(data)
+    self._irq(_IRQ_GATTS_WRITE, (central.conn_handle, value_handle))
+
+  def _connection_update(self, central, conn_interval, conn_latency, supervision_timeout):
+    self._irq(_IRQ_CONNECTION_UPDATE, (central.conn_handle, conn_interval, conn_latency, supervision_timeout, 0))
+
+  def _mtu_exchanged(self, central, mtu):
+    central.mtu = min(mtu, self._mtu)
+    self._irq(_IRQ_MTU_EXCHANGED, (central.conn_handle, central.mtu))
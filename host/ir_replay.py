@@ -0,0 +1,94 @@
+# Replays the IR bursts recorded by remote_control/stm32_ir_recorder.py
+# through the decoders on a PC, with the machine.Pin and machine.Timer
+# stand-ins: each edge is passed to the decoder as the capture interrupt
+# would, then the block timer is fired.
+#
+#   bursts = read_bursts(open('ir.bin', 'rb').read())
+#   for result in replay(NEC_8, bursts):
+#     ...   # (cmd, addr, ext) or error code
+#
+# Command line (prints one result per burst, to compare with a previous run):
+#   python host/ir_replay.py ir.bin [NEC_8|NEC_16|SONY_12|SONY_15|SONY_20|RC5_IR|RC6_M0|IR_AUTO]
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'remote_control'))
+
+from machine import Pin
+
+MAGIC = b'IRR\x01'
+_TICKS_MAX = 0x3FFFFFFF
+
+
+# Returns the bursts of a recording: lists of edge times (µs, first edge at 0)
+def read_bursts(data):
+  if data[:4] != MAGIC:
+    raise ValueError('not an IR recording')
+  bursts = []
+  pos = 4
+  while pos < len(data):
+    nedges = data[pos]
+    pos += 1
+    t = 0
+    times = [t]
+    for _ in range(nedges - 1):
+      t += data[pos] | (data[pos + 1] << 8)
+      times.append(t)
+      pos += 2
+    bursts.append(times)
+  return bursts
+
+
+# Writes bursts (lists of edge times) in the recording format, e.g. to build
+# regression files from synthetic or hand edited bursts
+def write_bursts(path, bursts):
+  with open(path, 'wb') as f:
+    f.write(MAGIC)
+    for times in bursts:
+      f.write(bytes((len(times),)))
+      for x in range(len(times) - 1):
+        f.write(min(times[x + 1] - times[x], 0xFFFF).to_bytes(2, 'little'))
+
+
+def decoder_class(name):
+  if name.startswith('NEC'):
+    module = 'stm32_nec'
+  elif name.startswith('SONY'):
+    module = 'stm32_sony'
+  elif name.startswith('RC'):
+    module = 'stm32_philips'
+  else:
+    module = 'stm32_ir_auto'
+  return getattr(__import__(module), name)
+
+
+# Creates a decoder of class cls (or class name) on a fake pin
+def make_decoder(cls):
+  if isinstance(cls, str):
+    cls = decoder_class(cls)
+  return cls(Pin(0, Pin.IN), None)
+
+
+# Decodes the bursts with ir (decoder or decoder class), returns the results
+def replay(ir, bursts, t0=1000):
+  if not hasattr(ir, 'decode'):
+    ir = make_decoder(ir)
+  results = []
+  ir.callback = lambda cmd, addr, ext: results.append((cmd, addr, ext))
+  ir.error_function(results.append)
+  for times in bursts:
+    for t in times:
+      ir._cb_edge((t0 + t) & _TICKS_MAX)
+    ir.tim.fire()
+    t0 += times[-1] + 40000
+  return results
+
+
+if __name__ == '__main__':
+  with open(sys.argv[1], 'rb') as f:
+    bursts = read_bursts(f.read())
+  ir = make_decoder(sys.argv[2] if len(sys.argv) > 2 else 'IR_AUTO')
+  for times, result in zip(bursts, replay(ir, bursts)):
+    print(len(times), result)
+  print('bursts: %d, results: %s' % (len(bursts), list(ir.counts)), file=sys.stderr)
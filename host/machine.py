@@ -0,0 +1,92 @@
+# Host (CPython) stand-in for the MicroPython "machine" module.
+# Timers do not run by themselves: call fire() to run their callback.
+# SoftSPI clocks its bits through the pyb.Pin stand-in, so that it drives the
+# simulated devices registered in pyb.Pin.devices (e.g. host/tlc1543.py).
+
+
+class Timer:
+  ONE_SHOT = 0
+  PERIODIC = 1
+
+  def __init__(self, id=-1, **kwargs):
+    self.id = id
+    self.callback = None
+    self.period = None
+    self.mode = None
+    if kwargs:
+      self.init(**kwargs)
+
+  def init(self, mode=PERIODIC, period=-1, freq=None, callback=None):
+    self.mode = mode
+    self.period = period
+    self.callback = callback
+
+  def deinit(self):
+    self.callback = None
+
+  # Runs the timer callback as the timer interrupt would
+  def fire(self):
+    callback = self.callback
+    if self.mode == Timer.ONE_SHOT:
+      self.callback = None
+    if callback:
+      callback(self)
+
+
+class Pin:
+  IN = 0
+  OUT = 1
+  IRQ_FALLING = 1
+  IRQ_RISING = 2
+
+  def __init__(self, id=None, mode=-1, value=0):
+    self.id = id
+    self.mode = mode
+    self._value = value
+    self.handler = None
+
+  def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+    self.handler = handler
+
+  def value(self, v=None):
+    if v is None:
+      return self._value
+    self._value = v
+
+  def on(self):
+    self._value = 1
+
+  def off(self):
+    self._value = 0
+
+
+class SoftSPI:
+  MSB = 0
+  LSB = 1
+
+  def __init__(self, baudrate=500000, polarity=0, phase=0, bits=8, firstbit=MSB, sck=None, mosi=None, miso=None):
+    import pyb
+    if phase:
+      raise ValueError('only phase 0 is simulated')
+    self.baudrate = baudrate
+    self._polarity = polarity
+    self._sck = pyb.Pin(sck.id, pyb.Pin.OUT, value=polarity)
+    self._mosi = pyb.Pin(mosi.id, pyb.Pin.OUT)
+    self._miso = pyb.Pin(miso.id, pyb.Pin.IN)
+
+  def write_readinto(self, write_buf, read_buf):
+    for i in range(len(write_buf)):
+      out = write_buf[i]
+      data = 0
+      for bit in range(7, -1, -1):
+        self._mosi.value((out >> bit) & 1)
+        data = (data << 1) | self._miso.value()
+        self._sck.value(not self._polarity)
+        self._sck.value(self._polarity)
+      read_buf[i] = data
+
+  def write(self, buf):
+    self.write_readinto(buf, bytearray(len(buf)))
+
+  def readinto(self, buf, write=0):
+    self.write_readinto(bytes([write]) * len(buf), buf)
@@ -0,0 +1,31 @@
+# Host (CPython) stand-in for the MicroPython "micropython" module.
+# Only what the libraries of this repository use is provided.
+
+# Scheduled callbacks waiting for run_scheduled()
+_pending = []
+# Run scheduled callbacks immediately (default) or queue them for run_scheduled()
+immediate = True
+
+
+def const(value):
+  return value
+
+
+def schedule(func, arg):
+  if immediate:
+    func(arg)
+  else:
+    if len(_pending) >= 8:
+      raise RuntimeError('schedule queue full')
+    _pending.append((func, arg))
+
+
+# Runs the callbacks queued by schedule() when immediate is False
+def run_scheduled():
+  while _pending:
+    func, arg = _pending.pop(0)
+    func(arg)
+
+
+def alloc_emergency_exception_buf(size):
+  pass
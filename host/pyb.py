@@ -0,0 +1,137 @@
+# Host (CPython) stand-in for the MicroPython "pyb" module.
+
+
+# Pins are not connected to anything, unless a simulated device (e.g.
+# host/tlc1543.py) is registered for their name in Pin.devices: writes are
+# then passed to device.pin_write(id, value) and reads to device.pin_read(id).
+class Pin:
+  IN = 0
+  OUT = 1
+  OUT_PP = 1
+  PULL_NONE = 0
+  PULL_UP = 1
+  PULL_DOWN = 2
+
+  devices = {}
+
+  def __init__(self, id, mode=IN, pull=PULL_NONE, value=None):
+    self.id = id
+    self.mode = mode
+    self.pull = pull
+    self._value = 0
+    if value is not None:
+      self.value(value)
+
+  def value(self, v=None):
+    device = Pin.devices.get(self.id)
+    if v is None:
+      return device.pin_read(self.id) if device else self._value
+    self._value = 1 if v else 0
+    if device:
+      device.pin_write(self.id, self._value)
+
+  def on(self):
+    self.value(1)
+
+  def off(self):
+    self.value(0)
+
+  high = on
+  low = off
+
+
+class LED:
+  def __init__(self, id):
+    self.id = id
+    self.state = 0
+
+  def on(self):
+    self.state = 1
+
+  def off(self):
+    self.state = 0
+
+  def toggle(self):
+    self.state ^= 1
+
+
+# Timers do not run by themselves: call fire() to run their callback, and
+# TimerChannel.capture_edge() with the counter value latched by an edge.
+class Timer:
+  UP = 0
+  PWM = 0
+  OC_TIMING = 2
+  IC = 8
+  RISING = 0
+  FALLING = 2
+  BOTH = 10
+
+  def __init__(self, id, **kwargs):
+    self.id = id
+    self.prescaler = 0
+    self.period = 0xFFFF
+    self._counter = 0
+    self._channels = {}
+    if kwargs:
+      self.init(**kwargs)
+
+  def init(self, freq=None, prescaler=0, period=0xFFFF, mode=UP, callback=None):
+    self.freq = freq
+    self.prescaler = prescaler
+    self.period = period
+    self._callback = callback
+
+  def deinit(self):
+    self._callback = None
+    for channel in self._channels.values():
+      channel.callback(None)
+
+  def callback(self, fun):
+    self._callback = fun
+
+  # Runs the timer callback as the update interrupt would
+  def fire(self):
+    if self._callback:
+      self._callback(self)
+
+  # Clock of the STM32F401 timers
+  def source_freq(self):
+    return 84000000
+
+  def counter(self, value=None):
+    if value is None:
+      return self._counter
+    self._counter = value
+
+  def channel(self, channel, mode=None, pin=None, polarity=None, callback=None):
+    ch = TimerChannel(self, channel, mode, pin, polarity)
+    ch.callback(callback)
+    self._channels[channel] = ch
+    return ch
+
+
+class TimerChannel:
+  def __init__(self, timer, channel, mode, pin, polarity):
+    self.timer = timer
+    self.channel = channel
+    self.mode = mode
+    self.pin = pin
+    self.polarity = polarity
+    self._value = 0
+    self._callback = None
+
+  def callback(self, fun):
+    self._callback = fun
+
+  def capture(self, value=None):
+    if value is None:
+      return self._value
+    self._value = value
+
+  # Latches value (counter value at the edge) and runs the channel callback
+  # as the capture interrupt would
+  def capture_edge(self, value):
+    self._value = value & self.timer.period
+    self.timer._counter = self._value
+    if self._callback:
+      self._callback(self.timer)
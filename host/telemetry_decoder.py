@@ -0,0 +1,111 @@
+# Decoder of the telemetry frames produced by bluetooth/stm32_ble_telemetry.py,
+# for a PC receiving the BLE UART stream (plain CPython, no dependency).
+#
+#   decoder = FrameDecoder()
+#   for seq, samples in decoder.feed(received_bytes):
+#     ...   # samples: list of tuples, one value per channel
+#
+# Command line: python host/telemetry_decoder.py capture.bin   (prints CSV)
+
+import sys
+
+
+def crc16(data):
+  crc = 0xFFFF
+  for b in data:
+    crc ^= b << 8
+    for _ in range(8):
+      crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+    crc &= 0xFFFF
+  return crc
+
+
+def cobs_decode(frame):
+  out = bytearray()
+  i = 0
+  while i < len(frame):
+    code = frame[i]
+    if code == 0 or i + code > len(frame) + 1:
+      raise ValueError('bad COBS frame')
+    out += frame[i + 1:i + code]
+    i += code
+    if code < 0xFF and i < len(frame):
+      out.append(0)
+  return bytes(out)
+
+
+def _varints(data, pos, count):
+  values = []
+  for _ in range(count):
+    value = 0
+    shift = 0
+    while True:
+      b = data[pos]
+      pos += 1
+      value |= (b & 0x7F) << shift
+      shift += 7
+      if not b & 0x80:
+        break
+    values.append((value >> 1) ^ -(value & 1))
+  return values, pos
+
+
+# Decodes one frame (without its 0x00 delimiter), returns (seq, samples)
+def decode_frame(frame):
+  raw = cobs_decode(frame)
+  if len(raw) < 5:
+    raise ValueError('frame too short')
+  if crc16(raw[:-2]) != raw[-2] | (raw[-1] << 8):
+    raise ValueError('bad CRC')
+  seq, channels, count = raw[0], raw[1], raw[2]
+  pos = 3
+  samples = []
+  previous = None
+  for _ in range(count):
+    values, pos = _varints(raw, pos, channels)
+    if previous is not None:
+      values = [p + d for p, d in zip(previous, values)]
+    samples.append(tuple(values))
+    previous = values
+  if pos != len(raw) - 2:
+    raise ValueError('bad frame length')
+  return seq, samples
+
+
+class FrameDecoder:
+
+  def __init__(self):
+    self._buffer = bytearray()
+    self._seq = None
+    self.errors = 0 # Frames rejected (CRC, COBS, length)
+    self.lost = 0 # Frames missing according to the sequence numbers
+
+  # Feeds received bytes, yields the (seq, samples) of every complete frame
+  def feed(self, data):
+    self._buffer += data
+    while True:
+      end = self._buffer.find(0)
+      if end < 0:
+        return
+      frame = bytes(self._buffer[:end])
+      del self._buffer[:end + 1]
+      if not frame:
+        continue
+      try:
+        seq, samples = decode_frame(frame)
+      except (ValueError, IndexError):
+        self.errors += 1
+        continue
+      if self._seq is not None:
+        self.lost += (seq - self._seq - 1) & 0xFF
+      self._seq = seq
+      yield seq, samples
+
+
+if __name__ == '__main__':
+  decoder = FrameDecoder()
+  with open(sys.argv[1], 'rb') as f:
+    for seq, samples in decoder.feed(f.read()):
+      for sample in samples:
+        print(','.join(str(v) for v in sample))
+  print('errors: %d, lost frames: %d' % (decoder.errors, decoder.lost), file=sys.stderr)
@@ -0,0 +1,99 @@
+# Simulated TLC1543 (10-bit, 11 channel ADC of the AlphaBot2 line sensors)
+# for the host stand-ins. It is connected to the pyb.Pin stand-ins by pin
+# name and follows the serial protocol:
+#   - CS falling edge, or end of a conversion while CS stays low: the result
+#     of the previous conversion is presented on DATA OUT, MSB first
+#   - clocks 1 to 4: channel address sampled on the rising edges
+#   - clocks 1 to 10: next result bit presented after each falling edge
+#   - after the 10th clock the conversion of the addressed channel starts and
+#     lasts 21µs; clocks received meanwhile are ignored (and counted)
+#
+#   adc = TLC1543([100, 200, 300, 400, 500])
+#   sensors = TRSensors()   # reads the values above
+
+import time
+import pyb
+
+_CONVERSION_S = 21e-6
+_BITS = 10
+_CHANNELS = 11
+
+
+class TLC1543:
+
+  def __init__(self, values=None, cs='D10', dout='D11', addr='D12', clk='D13'):
+    self.values = [0] * _CHANNELS
+    if values:
+      self.values[0:len(values)] = values
+    self._cs_pin, self._dout_pin, self._addr_pin, self._clk_pin = cs, dout, addr, clk
+    for pin in (cs, dout, addr, clk):
+      pyb.Pin.devices[pin] = self
+    self._cs = 1
+    self._clk = 0
+    self._addr = 0
+    self._bit = _BITS # _BITS: no frame in progress
+    self._shift = 0
+    self._address_in = 0
+    self._result = 0
+    self._channel = 0
+    self._converting_until = None
+    self.conversions = 0
+    self.ignored_clocks = 0 # Clocks received during a conversion
+
+  def close(self):
+    for pin in (self._cs_pin, self._dout_pin, self._addr_pin, self._clk_pin):
+      pyb.Pin.devices.pop(pin, None)
+
+  def _update(self):
+    if self._converting_until is not None and time.perf_counter() >= self._converting_until:
+      self._converting_until = None
+      self._result = self.values[self._channel] & 0x3FF
+    if not self._cs and self._converting_until is None and self._bit == _BITS:
+      # New frame
+      self._bit = 0
+      self._shift = self._result
+      self._address_in = 0
+
+  def pin_read(self, pin):
+    if pin == self._dout_pin:
+      self._update()
+      if self._cs or self._bit >= _BITS:
+        return 0
+      return (self._shift >> (_BITS - 1 - self._bit)) & 1
+    if pin == self._cs_pin:
+      return self._cs
+    if pin == self._clk_pin:
+      return self._clk
+    return self._addr
+
+  def pin_write(self, pin, value):
+    if pin == self._cs_pin:
+      if self._cs and not value:
+        self._bit = _BITS
+        self._cs = 0
+        self._update()
+      self._cs = value
+    elif pin == self._addr_pin:
+      self._addr = value
+    elif pin == self._clk_pin:
+      if not self._cs:
+        if value and not self._clk:
+          self._rising()
+        elif not value and self._clk:
+          self._falling()
+      self._clk = value
+
+  def _rising(self):
+    self._update()
+    if self._bit >= _BITS:
+      self.ignored_clocks += 1
+    elif self._bit < 4:
+      self._address_in = (self._address_in << 1) | self._addr
+
+  def _falling(self):
+    if self._bit < _BITS:
+      self._bit += 1
+      if self._bit == _BITS:
+        self._channel = self._address_in if self._address_in < _CHANNELS else 0
+        self._converting_until = time.perf_counter() + _CONVERSION_S
+        self.conversions += 1
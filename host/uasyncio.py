@@ -0,0 +1,24 @@
+# Host (CPython) stand-in for the MicroPython "uasyncio" module:
+# asyncio plus the MicroPython specific ThreadSafeFlag and sleep_ms.
+
+from asyncio import *
+import asyncio as _asyncio
+
+
+class ThreadSafeFlag:
+  def __init__(self):
+    self._event = _asyncio.Event()
+
+  def set(self):
+    self._event.set()
+
+  def clear(self):
+    self._event.clear()
+
+  async def wait(self):
+    await self._event.wait()
+    self._event.clear()
+
+
+async def sleep_ms(ms):
+  await _asyncio.sleep(ms / 1000)
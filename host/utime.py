@@ -0,0 +1,36 @@
+# Host (CPython) stand-in for the MicroPython "utime" module.
+
+import time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+
+def ticks_us():
+  return int(time.perf_counter() * 1000000) & _TICKS_MAX
+
+
+def ticks_ms():
+  return int(time.perf_counter() * 1000) & _TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+  return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+  diff = (ticks1 - ticks2) & _TICKS_MAX
+  return ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def sleep_ms(ms):
+  time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+  time.sleep(us / 1000000)
+
+
+def sleep(s):
+  time.sleep(s)
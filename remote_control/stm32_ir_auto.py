@@ -0,0 +1,104 @@
+# ir_auto.py Decoder for IR remote controls of several protocols
+# Recognises NEC (8 and 16 bit addresses), Sony SIRC (12, 15 and 20 bits),
+# Philips RC-5 and RC-6 mode 0 with a single receiver.
+#
+# The protocol is classified in the pin interrupt, from the leader timing, as
+# soon as the third edge is received:
+#   leader mark >= 4ms               NEC (9ms mark)
+#   leader mark >= 2.1ms, space < 750µs  Sony (2.4ms mark, 600µs space)
+#   leader mark >= 2.1ms, space >= 750µs RC-6 (2.666ms mark, 889µs space)
+#   shorter leader mark              RC-5 (889µs or 1.778ms mark)
+# The block timer, started with the longest block time on the first edge, is
+# then re-armed with the block time of the protocol, so that the decode runs
+# as early as with the dedicated decoder. The decode itself is the one of the
+# protocol class (stm32_nec.py, stm32_sony.py, stm32_philips.py).
+#
+# The protocol of the last burst is in the protocol attribute, e.g.
+#   def callback(cmd, addr, ext):
+#     print(ir.protocol, cmd, addr, ext)
+#   ir = IR_AUTO(Pin('A5', Pin.IN), callback)
+
+from micropython import const
+from machine import Timer
+from utime import ticks_diff
+from stm32_ir_receiver import IR_RX
+from stm32_nec import NEC_ABC
+from stm32_sony import SONY_ABC
+from stm32_philips import RC5_IR, RC6_M0
+
+PROTO_UNKNOWN = const(-1)
+PROTO_NEC = const(0)
+PROTO_SONY = const(1)
+PROTO_RC5 = const(2)
+PROTO_RC6 = const(3)
+
+# Leader thresholds (µs)
+_NEC_MARK_MIN = const(4000)
+_LONG_MARK_MIN = const(2100) # Longest RC-5 mark is 1.778ms
+_SONY_SPACE_MAX = const(750)
+
+# Edge index at which the protocol is classified (end of the leader space)
+_CLASSIFY_EDGE = const(2)
+
+# Indexed by protocol
+_TBLOCKS = (NEC_ABC.TBLOCK, SONY_ABC.TBLOCK, RC5_IR.TBLOCK, RC6_M0.TBLOCK)
+_DECODERS = (NEC_ABC._decode, SONY_ABC._decode, RC5_IR._decode, RC6_M0._decode)
+
+class IR_AUTO(IR_RX):
+  def __init__(self, pin, callback, *args):
+    nedges = max(NEC_ABC.NEDGES, SONY_ABC.NEDGES, RC5_IR.NEDGES, RC6_M0.NEDGES)
+    super().__init__(pin, nedges, max(_TBLOCKS), callback, *args)
+    # State used by the protocol decoders
+    self._extended = True # NEC: accept 16 bit addresses
+    self.adaptive(False)
+    self._bits = 20 # Sony: accept 12, 15 and 20 bit frames
+    self._addr = 0
+    self._ext = 0
+    self.protocol = PROTO_UNKNOWN
+
+  # Opt-in adaptive NEC bit threshold, see NEC_ABC.adaptive()
+  adaptive = NEC_ABC.adaptive
+  _adapt = NEC_ABC._adapt
+
+  # Edge at time t. As IR_RX._cb_edge, plus the classification of the burst.
+  def _cb_edge(self, t):
+    edge = self.edge
+    # On overrun ignore pulses until software timer times out
+    if edge <= self._nedges:  # Allow 1 extra pulse to record overrun
+      if not edge:  # First edge received
+        self.protocol = PROTO_UNKNOWN
+        self.tim.init(period=self._tblock, mode=Timer.ONE_SHOT, callback=self.cb)
+      self._times[edge] = t
+      self.edge = edge + 1
+      if edge == _CLASSIFY_EDGE:
+        self._classify(t)
+
+  def _classify(self, t):
+    times = self._times
+    mark = ticks_diff(times[1], times[0])
+    if mark >= _NEC_MARK_MIN:
+      protocol = PROTO_NEC
+    elif mark >= _LONG_MARK_MIN:
+      protocol = PROTO_SONY if ticks_diff(times[2], times[1]) < _SONY_SPACE_MAX else PROTO_RC6
+    else:
+      protocol = PROTO_RC5
+    self.protocol = protocol
+    tblock = _TBLOCKS[protocol]
+    if tblock < self._tblock:
+      # Re-arm the block timer for the remaining time of the protocol block
+      period = tblock - ticks_diff(t, times[0]) // 1000
+      self.tim.init(period=period if period > 0 else 1, mode=Timer.ONE_SHOT, callback=self.cb)
+
+  def decode(self, _):
+    protocol = self.protocol
+    if protocol == PROTO_UNKNOWN:  # Less than 3 edges: noise
+      cmd = self.BADSTART
+    else:
+      cmd = _DECODERS[protocol](self)
+    if cmd >= 0 or (cmd == self.REPEAT and protocol == PROTO_NEC):
+      addr = self._addr  # NEC repeat uses last address
+      ext = self._ext if protocol != PROTO_NEC else 0
+    else:
+      addr = 0
+      ext = 0
+    self.do_callback(cmd, addr, ext, self.REPEAT)
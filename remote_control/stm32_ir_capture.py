@@ -0,0 +1,60 @@
+# ir_capture.py Hardware timed edge capture for IR_RX decoders
+# By default IR_RX timestamps edges with ticks_us() in a pin interrupt: when
+# BLE or UART interrupts delay it, the edge times jitter and bursts are lost
+# (BADBLOCK). TimerCapture uses a timer channel in input capture mode: the
+# timer latches the counter on each edge (both polarities), the interrupt only
+# reads the latched value, so its latency does not matter as long as it runs
+# before the next edge.
+#
+# The timer counts microseconds. Counter values are unwrapped into the
+# ticks_us() period (2**30), so that decoders use the _times array with
+# ticks_diff() as usual. A 32-bit timer (TIM2, TIM5) counts over the whole
+# period, a 16-bit timer wraps every 65ms, more than any space within a burst.
+#
+# The pin must be a channel of the timer, e.g. on a Nucleo F401RE D7 (PA8) is
+# TIM1 channel 1, A0 (PA0) is TIM2 channel 1 and TIM5 channel 1:
+#   ir = NEC_8(TimerCapture(2, 1, Pin('A0')), callback)
+
+from micropython import const
+import pyb
+
+_TICKS_MAX = const(0x3FFFFFFF)  # ticks_us() period - 1
+_COUNTER_16BIT = const(0xFFFF)
+_TIMERS_32BIT = (2, 5)
+
+class TimerCapture():
+  def __init__(self, timer, channel, pin):
+    period = _TICKS_MAX if timer in _TIMERS_32BIT else _COUNTER_16BIT
+    self._period = period
+    self._tim = pyb.Timer(timer)
+    self._tim.init(prescaler=self._tim.source_freq() // 1000000 - 1, period=period)
+    self._ch = self._tim.channel(channel, pyb.Timer.IC, pin=pin, polarity=pyb.Timer.BOTH)
+    self._handler = None
+    self._cap = 0  # Last counter value
+    self._t = 0  # Last edge time (µs, unwrapped)
+    self._cb_ref = self._cb  # Allocate the bound method once
+
+  # Calls handler(t) on each edge, t being the edge time in µs (called by IR_RX)
+  def attach(self, handler):
+    self._handler = handler
+    self._cap = self._ch.capture()
+    self._ch.callback(self._cb_ref)
+
+  def detach(self):
+    self._ch.callback(None)
+    self._handler = None
+
+  def deinit(self):
+    self.detach()
+    self._tim.deinit()
+
+  def _cb(self, tim):
+    cap = self._ch.capture()
+    d = (cap - self._cap) & self._period
+    # Wrap into the ticks_us() period without exceeding the small int range
+    if d > _TICKS_MAX - self._t:
+      self._t = d - (_TICKS_MAX + 1 - self._t)
+    else:
+      self._t += d
+    self._cap = cap
+    self._handler(self._t)
@@ -0,0 +1,104 @@
+# ir_keys.py Key hold tracking for IR remote control decoders
+# While a key is held a NEC remote sends one data frame then a repeat frame
+# every 108ms, which the decoder passes as the code REPEAT. KeyTracker, used
+# as the decoder callback, turns them into key events:
+#   KEY_DOWN   first frame of a key
+#   KEY_REPEAT each repeat frame while the key is held
+#   KEY_UP     no repeat frame for release_ms, or another key pressed
+# Each event gives the hold time (ms), the number of repeats and a step taken
+# from an acceleration curve: a tuple of (repeats, step) pairs sorted by
+# repeats, the step being the one of the last pair reached. E.g. ACCEL_JOG
+# gives 1 on key down, 0 for the first two repeats (no auto-repeat on a short
+# press), then 1, 2 from the 10th repeat and 5 from the 20th.
+# Remotes resending the whole frame while a key is held (Sony, RC-5, RC-6)
+# need frame_repeats=True: an identical frame within release_ms is then a
+# repeat (RC-5/RC-6 change the toggle bit, passed as ext, on each new press).
+#
+#   def jog(event, cmd, addr, hold_ms, repeats, step):
+#     if event != KEY_UP:
+#       position += step
+#   keys = KeyTracker(jog, curve=ACCEL_JOG)
+#   ir = NEC_8(Pin('A5', Pin.IN), keys.put)
+#
+# The callback runs in the decoder or release timer context, no heap
+# allocation is made.
+
+from micropython import const
+from machine import Timer
+from utime import ticks_ms, ticks_diff
+
+KEY_DOWN = const(0)
+KEY_REPEAT = const(1)
+KEY_UP = const(2)
+
+ACCEL_NONE = ((0, 1),)
+ACCEL_JOG = ((0, 1), (1, 0), (3, 1), (10, 2), (20, 5))
+
+_REPEAT = const(-1)  # IR_RX.REPEAT
+_NO_KEY = const(-1)
+
+class KeyTracker():
+  def __init__(self, callback, release_ms=160, curve=ACCEL_NONE, frame_repeats=False):
+    self.callback = callback
+    self._release_ms = release_ms
+    self._curve = curve
+    self._frame_repeats = frame_repeats
+    self.key = _NO_KEY  # Command of the held key
+    self.addr = 0
+    self.ext = 0
+    self.repeats = 0
+    self._t_down = 0
+    self._t_last = 0
+    self._tim = Timer(-1)
+    self._up_ref = self._up  # Allocate the bound method once
+
+  # Decoder callback
+  def put(self, cmd, addr, ext):
+    if cmd == _REPEAT:
+      if self.key == _NO_KEY:  # Key down frame missed
+        return
+      self._repeat()
+    elif cmd < 0:
+      return
+    elif (self._frame_repeats and cmd == self.key and addr == self.addr
+          and ext == self.ext):
+      self._repeat()
+    else:
+      if self.key != _NO_KEY:
+        self._release()
+      self.key = cmd
+      self.addr = addr
+      self.ext = ext
+      self.repeats = 0
+      self._t_down = self._t_last = ticks_ms()
+      self.callback(KEY_DOWN, cmd, addr, 0, 0, self.step(0))
+    self._tim.init(period=self._release_ms, mode=Timer.ONE_SHOT, callback=self._up_ref)
+
+  # Step of the acceleration curve after repeats repeat frames
+  def step(self, repeats):
+    curve = self._curve
+    step = 0
+    for i in range(len(curve)):
+      if repeats < curve[i][0]:
+        break
+      step = curve[i][1]
+    return step
+
+  def _repeat(self):
+    self.repeats += 1
+    self._t_last = ticks_ms()
+    self.callback(KEY_REPEAT, self.key, self.addr, ticks_diff(self._t_last, self._t_down),
+      self.repeats, self.step(self.repeats))
+
+  # Release timer callback
+  def _up(self, tim):
+    if self.key != _NO_KEY:
+      self._release()
+
+  def _release(self):
+    key = self.key
+    self.key = _NO_KEY
+    self.callback(KEY_UP, key, self.addr, ticks_diff(self._t_last, self._t_down), self.repeats, 0)
+
+  def close(self):
+    self._tim.deinit()
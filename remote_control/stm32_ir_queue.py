@@ -0,0 +1,83 @@
+# ir_queue.py Event queue for IR remote control decoders
+# The decoders run the user callback in the block timer callback: slow user
+# code delays the next capture. IRQueue is used as the callback instead: it
+# stores (cmd, addr, ext, timestamp) in preallocated arrays, without heap
+# allocation, and the application pulls the events when it has time, by
+# polling or by awaiting them in uasyncio. Events arriving while the queue is
+# full are dropped and counted.
+#
+#   queue = IRQueue(8)
+#   ir = NEC_8(Pin('A5', Pin.IN), queue.put)  # or queue.attach(ir)
+#   while True:
+#     event = queue.get()  # or event = await queue.wait()
+#     if event:
+#       cmd, addr, ext, timestamp = event
+
+from array import array
+from utime import ticks_ms
+
+class IRQueue():
+  def __init__(self, size=8):
+    size += 1  # One slot stays free to tell a full queue from an empty one
+    self._size = size
+    self._cmd = array('i', (0 for _ in range(size)))
+    self._addr = array('i', (0 for _ in range(size)))
+    self._ext = array('i', (0 for _ in range(size)))
+    self._ts = array('i', (0 for _ in range(size)))
+    self._head = 0
+    self._tail = 0
+    self._flag = None  # uasyncio.ThreadSafeFlag, created by the first wait()
+    self.dropped = 0  # Events lost because the queue was full
+    self.errors = 0  # Bursts not decoded (see attach())
+
+  # Makes the decoder ir push its events to the queue and count its errors
+  def attach(self, ir):
+    ir.callback = self.put
+    ir.args = ()
+    ir.error_function(self._error)
+
+  # Decoder callback, runs in timer context: no allocation
+  def put(self, cmd, addr, ext):
+    i = self._head
+    nxt = (i + 1) % self._size
+    if nxt == self._tail:
+      self.dropped += 1
+      return
+    self._cmd[i] = cmd
+    self._addr[i] = addr
+    self._ext[i] = ext
+    self._ts[i] = ticks_ms()
+    self._head = nxt
+    if self._flag is not None:
+      self._flag.set()
+
+  def _error(self, code):
+    self.errors += 1
+
+  # Number of pending events
+  def any(self):
+    n = self._head - self._tail
+    return n + self._size if n < 0 else n
+
+  # Returns the oldest event (cmd, addr, ext, timestamp in ms), None if the queue is empty
+  def get(self):
+    i = self._tail
+    if i == self._head:
+      return None
+    event = (self._cmd[i], self._addr[i], self._ext[i], self._ts[i])
+    self._tail = (i + 1) % self._size
+    return event
+
+  # Waits for the next event (uasyncio)
+  async def wait(self):
+    if self._flag is None:
+      from uasyncio import ThreadSafeFlag
+      self._flag = ThreadSafeFlag()
+    while True:
+      event = self.get()
+      if event:
+        return event
+      await self._flag.wait()
+
+  def clear(self):
+    self._tail = self._head
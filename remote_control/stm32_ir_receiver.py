@@ -6,7 +6,7 @@
 
 from machine import Timer, Pin
 from array import array
-from utime import ticks_us
+from utime import ticks_us, ticks_diff
 
 # Save RAM
 # from micropython import alloc_emergency_exception_buf
@@ -39,14 +39,31 @@ class IR_RX():
     self.verbose = False
 
     self._times = array('i',  (0 for _ in range(nedges + 1)))  # +1 for overrun
-    pin.irq(handler = self._cb_pin, trigger = (Pin.IRQ_FALLING | Pin.IRQ_RISING))
     self.edge = 0
     self.tim = Timer(-1)  # Sofware timer
     self.cb = self.decode
 
+    # Number of bursts per result: counts[0] commands, counts[-code] for the
+    # REPEAT and error codes
+    self.counts = array('i', (0 for _ in range(-self.BADADDR + 1)))
+    # Mark and space width histograms, see histogram()
+    self.mark_hist = None
+    self.space_hist = None
+    self._hist_bin = 0
+
+    # Edges are recorded once everything used by the interrupt exists
+    if hasattr(pin, 'attach'):
+      # Capture backend (stm32_ir_capture.py): calls _cb_edge with the edge time
+      pin.attach(self._cb_edge)
+    else:
+      pin.irq(handler = self._cb_pin, trigger = (Pin.IRQ_FALLING | Pin.IRQ_RISING))
+
   # Pin interrupt. Save time of each edge for later decode.
   def _cb_pin(self, line):
-    t = ticks_us()
+    self._cb_edge(ticks_us())
+
+  # Edge at time t (µs, ticks_us() period)
+  def _cb_edge(self, t):
     # On overrun ignore pulses until software timer times out
     if self.edge <= self._nedges:  # Allow 1 extra pulse to record overrun
       if not self.edge:  # First edge received
@@ -55,15 +72,50 @@ class IR_RX():
       self.edge += 1
 
   def do_callback(self, cmd, addr, ext, thresh=0):
+    self.counts[0 if cmd >= 0 else -cmd] += 1
+    if self._hist_bin:
+      self._update_hist()
     self.edge = 0
     if cmd >= thresh:
-      self.callback(cmd, addr, ext, *self.args)
+      if self.args:
+        self.callback(cmd, addr, ext, *self.args)
+      else:
+        self.callback(cmd, addr, ext)  # No argument unpacking to allocate
     else:
       self._errf(cmd)
 
   def error_function(self, func):
     self._errf = func
 
+  # Records the widths of the marks and spaces of every burst in nbins bins of
+  # bin_us µs (the last bin counts longer pulses). bin_us = 0 stops recording.
+  def histogram(self, bin_us=100, nbins=64):
+    if bin_us:
+      self.mark_hist = array('i', (0 for _ in range(nbins)))
+      self.space_hist = array('i', (0 for _ in range(nbins)))
+    self._hist_bin = bin_us
+
+  def reset_stats(self):
+    for i in range(len(self.counts)):
+      self.counts[i] = 0
+    if self._hist_bin:
+      for i in range(len(self.mark_hist)):
+        self.mark_hist[i] = 0
+        self.space_hist[i] = 0
+
+  def _update_hist(self):
+    times = self._times
+    last = len(self.mark_hist) - 1
+    hist = self.mark_hist  # The burst starts with a mark
+    other = self.space_hist
+    for x in range(min(self.edge, self._nedges + 1) - 1):
+      i = ticks_diff(times[x + 1], times[x]) // self._hist_bin
+      hist[i if 0 <= i < last else last] += 1
+      hist, other = other, hist
+
   def close(self):
-    self._pin.irq(handler = None)
+    if hasattr(self._pin, 'detach'):
+      self._pin.detach()
+    else:
+      self._pin.irq(handler = None)
     self.tim.deinit()
@@ -0,0 +1,83 @@
+# ir_recorder.py Records the raw bursts received by an IR decoder to flash
+# To analyse a remote that does not decode, the edge times of every burst
+# are saved before being decoded, then the file is copied to a PC and
+# replayed through the decoders with host/ir_replay.py.
+#
+# File format (little endian):
+#   header: b'IRR' and the format version (1)
+#   each burst: number of edges n (1 byte), then n - 1 widths between
+#   consecutive edges in µs (2 bytes each, 65535 for longer)
+#
+# The burst is copied to a RAM buffer in the decoder timer callback, without
+# allocation, and written to the file later by micropython.schedule (or by
+# flush()). Bursts not fitting in the buffer are dropped and counted.
+#
+#   ir = NEC_8(Pin('A5', Pin.IN), callback)
+#   recorder = IRRecorder(ir, 'ir.bin')
+#   ...
+#   recorder.close()
+
+from micropython import const, schedule
+from utime import ticks_diff
+
+_MAGIC = b'IRR\x01'
+_WIDTH_MAX = const(0xFFFF)
+
+class IRRecorder():
+  def __init__(self, ir, path='ir.bin', buf_size=1024, append=False):
+    self._ir = ir
+    self._path = path
+    self._buf = bytearray(buf_size)
+    self._mv = memoryview(self._buf)
+    self._n = 0
+    self.bursts = 0  # Bursts recorded
+    self.dropped = 0  # Bursts lost because the buffer was full
+    if not append:
+      with open(path, 'wb') as f:
+        f.write(_MAGIC)
+    # Insert the recording before the decode in the block timer callback
+    self._decode = ir.cb
+    self._flush_ref = self._flush  # Allocate the bound methods once
+    ir.cb = self._record
+
+  def _record(self, tim):
+    ir = self._ir
+    times = ir._times
+    nedges = min(ir.edge, len(times))
+    size = 2 * nedges - 1
+    n = self._n
+    if nedges and n + size <= len(self._buf):
+      buf = self._buf
+      buf[n] = nedges
+      n += 1
+      for x in range(nedges - 1):
+        width = ticks_diff(times[x + 1], times[x])
+        if width > _WIDTH_MAX:
+          width = _WIDTH_MAX
+        buf[n] = width & 0xff
+        buf[n + 1] = width >> 8
+        n += 2
+      self._n = n
+      self.bursts += 1
+      try:
+        schedule(self._flush_ref, 0)
+      except RuntimeError:  # Schedule queue full: written with the next burst
+        pass
+    elif nedges:
+      self.dropped += 1
+    self._decode(tim)
+
+  def _flush(self, _):
+    self.flush()
+
+  # Appends the recorded bursts to the file
+  def flush(self):
+    if self._n:
+      with open(self._path, 'ab') as f:
+        f.write(self._mv[0:self._n])
+      self._n = 0
+
+  # Stops recording, the decoder goes on decoding
+  def close(self):
+    self._ir.cb = self._decode
+    self.flush()
@@ -5,54 +5,121 @@
 # Author: Peter Hinch
 # Copyright Peter Hinch 2020 Released under the MIT license
 
-from utime import ticks_us, ticks_diff
+from micropython import const
+from utime import ticks_diff
 from stm32_ir_receiver import IR_RX
 
+# Decoding thresholds (µs)
+_LEADER_MARK_MIN = const(4000) # 9ms leading mark for all valid data
+_DATA_SPACE_MIN = const(3000) # 4.5ms space for normal data
+_REPEAT_SPACE_MIN = const(1700) # 2.5ms space for a repeat code
+_ONE_SPACE_MIN = const(1120) # Space is 1.6875ms (1) or 562.5µs (0)
+
+_NEC_EDGES = const(68)
+
+# Adaptive bit threshold: exponential moving average of the 0 and 1 spaces
+# (weight 1/2**_EMA_SHIFT), the threshold staying between the bounds (µs)
+_ZERO_SPACE = const(563)
+_ONE_SPACE = const(1688)
+_EMA_SHIFT = const(3)
+_ONE_SPACE_LOW = const(800)
+_ONE_SPACE_HIGH = const(1500)
+
 class NEC_ABC(IR_RX):
+  # Block lasts <= 80ms (extended mode) and has 68 edges
+  NEDGES = _NEC_EDGES
+  TBLOCK = 80
+
   def __init__(self, pin, extended, callback, *args):
-    # Block lasts <= 80ms (extended mode) and has 68 edges
-    super().__init__(pin, 68, 80, callback, *args)
+    super().__init__(pin, self.NEDGES, self.TBLOCK, callback, *args)
     self._extended = extended
     self._addr = 0
+    self.adaptive(False)
 
+  # Opt-in: recentre the bit threshold (one_space_min) between the mean 0 and
+  # 1 spaces of the recent valid frames, for remotes with drifting timings
+  def adaptive(self, enable=True):
+    self._adaptive = enable
+    self.one_space_min = _ONE_SPACE_MIN
+    self._zero_space = _ZERO_SPACE
+    self._one_space = _ONE_SPACE
+
+  # Timer callback: decode the burst and run the user callback.
+  # Every outcome is an integer code, no exception nor heap allocation.
   def decode(self, _):
-    try:
-      if self.edge > 68:
-        raise RuntimeError(self.OVERRUN)
-      width = ticks_diff(self._times[1], self._times[0])
-      if width < 4000:  # 9ms leading mark for all valid data
-        raise RuntimeError(self.BADSTART)
-      width = ticks_diff(self._times[2], self._times[1])
-      if width > 3000:  # 4.5ms space for normal data
-        if self.edge < 68:  # Haven't received the correct number of edges
-          raise RuntimeError(self.BADBLOCK)
-        # Time spaces only (marks are always 562.5µs)
-        # Space is 1.6875ms (1) or 562.5µs (0)
-        # Skip last bit which is always 1
-        val = 0
-        for edge in range(3, 68 - 2, 2):
-          val >>= 1
-          if ticks_diff(self._times[edge + 1], self._times[edge]) > 1120:
-            val |= 0x80000000
-      elif width > 1700: # 2.5ms space for a repeat code. Should have exactly 4 edges.
-        raise RuntimeError(self.REPEAT if self.edge == 4 else self.BADREP)  # Treat REPEAT as error.
-      else:
-        raise RuntimeError(self.BADSTART)
-      addr = val & 0xff  # 8 bit addr
-      cmd = (val >> 16) & 0xff
-      if cmd != (val >> 24) ^ 0xff:
-        raise RuntimeError(self.BADDATA)
-      if addr != ((val >> 8) ^ 0xff) & 0xff:  # 8 bit addr doesn't match check
-        if not self._extended:
-          raise RuntimeError(self.BADADDR)
-        addr |= val & 0xff00  # pass assumed 16 bit address to callback
-      self._addr = addr
-    except RuntimeError as e:
-      cmd = e.args[0]
-      addr = self._addr if cmd == self.REPEAT else 0  # REPEAT uses last address
+    cmd = self._decode()
+    addr = self._addr if cmd >= 0 or cmd == self.REPEAT else 0  # REPEAT uses last address
     # Set up for new data burst and run user callback
     self.do_callback(cmd, addr, 0, self.REPEAT)
 
+  # Returns the command (>= 0, self._addr is then updated) or an error code
+  def _decode(self):
+    times = self._times
+    nedges = self.edge
+    if nedges > _NEC_EDGES:
+      return self.OVERRUN
+    if ticks_diff(times[1], times[0]) < _LEADER_MARK_MIN:
+      return self.BADSTART
+    width = ticks_diff(times[2], times[1])
+    if width <= _DATA_SPACE_MIN:
+      if width > _REPEAT_SPACE_MIN:
+        # Repeat code: should have exactly 4 edges
+        return self.REPEAT if nedges == 4 else self.BADREP
+      return self.BADSTART
+    if nedges < _NEC_EDGES:  # Haven't received the correct number of edges
+      return self.BADBLOCK
+    # Time spaces only (marks are always 562.5µs), LSB first. The 32 bits are
+    # kept in two 16-bit words so that no long integer is created.
+    # Skip last bit which is always 1
+    threshold = self.one_space_min
+    ones = 0 # Sum of the 1 spaces, the 0 spaces sum is total - ones
+    total = 0
+    low = 0 # Address and its complement (bits 0-15)
+    high = 0 # Command and its complement (bits 16-31)
+    bit = 1
+    for edge in range(3, 3 + 32, 2):
+      width = ticks_diff(times[edge + 1], times[edge])
+      total += width
+      if width > threshold:
+        low |= bit
+        ones += width
+      bit <<= 1
+    bit = 1
+    for edge in range(3 + 32, _NEC_EDGES - 1, 2):
+      width = ticks_diff(times[edge + 1], times[edge])
+      total += width
+      if width > threshold:
+        high |= bit
+        ones += width
+      bit <<= 1
+    cmd = high & 0xff
+    if cmd != (high >> 8) ^ 0xff:
+      return self.BADDATA
+    addr = low & 0xff  # 8 bit addr
+    if addr != ((low >> 8) ^ 0xff) & 0xff:  # 8 bit addr doesn't match check
+      if not self._extended:
+        return self.BADADDR
+      addr = low  # pass assumed 16 bit address to callback
+    self._addr = addr
+    if self._adaptive:
+      self._adapt(low, high, ones, total - ones)
+    return cmd
+
+  # Moves the bit threshold after a valid frame
+  def _adapt(self, low, high, ones, zeros):
+    n = 0 # Number of 1 bits
+    while low:
+      n += low & 1
+      low >>= 1
+    while high:
+      n += high & 1
+      high >>= 1
+    # The command and its complement give at least 8 bits of each value
+    self._zero_space += (zeros // (32 - n) - self._zero_space) >> _EMA_SHIFT
+    self._one_space += (ones // n - self._one_space) >> _EMA_SHIFT
+    threshold = (self._zero_space + self._one_space) >> 1
+    self.one_space_min = max(_ONE_SPACE_LOW, min(threshold, _ONE_SPACE_HIGH))
+
 class NEC_8(NEC_ABC):
   def __init__(self, pin, callback, *args):
     super().__init__(pin, False, callback, *args)
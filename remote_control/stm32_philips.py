@@ -0,0 +1,146 @@
+# philips.py Decoders for IR remote control using synchronous code
+# Supports Philips RC-5 RC-6 mode 0 protocols.
+
+# Author: Peter Hinch
+# Copyright Peter Hinch 2020 Released under the MIT license
+
+# Adapted: decoders return integer codes instead of raising exceptions,
+# see stm32_nec.py
+
+from micropython import const
+from utime import ticks_diff
+from stm32_ir_receiver import IR_RX
+
+_RC5_EDGES = const(28)
+_RC6_EDGES = const(44)
+
+class RC5_IR(IR_RX):
+  # Block lasts <= 30ms and has <= 28 edges
+  NEDGES = _RC5_EDGES
+  TBLOCK = 30
+
+  def __init__(self, pin, callback, *args):
+    super().__init__(pin, self.NEDGES, self.TBLOCK, callback, *args)
+    self._addr = 0
+    self._ext = 0
+
+  def decode(self, _):
+    cmd = self._decode()
+    if cmd < 0:
+      self._addr = 0
+      self._ext = 0
+    # Set up for new data burst and run user callback
+    self.do_callback(cmd, self._addr, self._ext)
+
+  # Returns the command (>= 0, self._addr and self._ext, the toggle bit, are then
+  # updated) or an error code
+  def _decode(self):
+    times = self._times
+    nedges = self.edge  # No. of edges detected
+    if nedges > _RC5_EDGES:
+      return self.OVERRUN
+    if nedges < 14:
+      return self.BADSTART
+    # Regenerate bitstream
+    bits = 1
+    bit = 1
+    v = 1  # 14 bit bitstream, MSB always 1
+    x = 0
+    while bits < 14:
+      # -1 convert count to index, -1 allow for 2nd edge of pair
+      if x > nedges - 2:
+        return self.BADBLOCK
+      # width is 889/1778 nominal
+      width = ticks_diff(times[x + 1], times[x])
+      if not 500 < width < 2100:
+        return self.BADBLOCK
+      if width < 1334:  # Short
+        x += 2
+      else:
+        bit ^= 1
+        x += 1
+      v = (v << 1) | bit
+      bits += 1
+    # Split into fields (val, addr, ctrl)
+    self._addr = (v >> 6) & 0x1f
+    self._ext = (v >> 11) & 1
+    return (v & 0x3f) | (0 if ((v >> 12) & 1) else 0x40)  # Correct the polarity of S2
+
+class RC6_M0(IR_RX):
+  # Even on Pyboard D the 444μs nominal pulses can be recorded as up to 705μs
+  # Scope shows 360-520 μs (-84μs +76μs relative to nominal)
+  # Header nominal 2666, 889, 444, 889, 444, 444, 444, 444 carrier ON at end
+  hdr = ((1800, 4000), (593, 1333), (222, 750), (593, 1333), (222, 750), (222, 750), (222, 750), (222, 750))
+  # Block lasts 23ms nominal and has <=44 edges
+  NEDGES = _RC6_EDGES
+  TBLOCK = 30
+
+  def __init__(self, pin, callback, *args):
+    super().__init__(pin, self.NEDGES, self.TBLOCK, callback, *args)
+    self._addr = 0
+    self._ext = 0
+
+  def decode(self, _):
+    cmd = self._decode()
+    if cmd < 0:
+      self._addr = 0
+      self._ext = 0
+    # Set up for new data burst and run user callback
+    self.do_callback(cmd, self._addr, self._ext)
+
+  # Returns the command (>= 0, self._addr and self._ext, the toggle bit, are then
+  # updated) or an error code
+  def _decode(self):
+    times = self._times
+    nedges = self.edge  # No. of edges detected
+    if nedges > _RC6_EDGES:
+      return self.OVERRUN
+    if nedges < 22:
+      return self.BADSTART
+    x = 0
+    for lims in RC6_M0.hdr:
+      width = ticks_diff(times[x + 1], times[x])
+      if not (lims[0] < width < lims[1]):
+        return self.BADSTART
+      x += 1
+    width = ticks_diff(times[x + 1], times[x])
+    # 2nd bit of last 0 is 444μs (0) or 1333μs (1)
+    if not 222 < width < 1555:
+      return self.BADBLOCK
+    if width < 889:  # Short
+      v = 0
+      x += 2
+    else:
+      v = 1
+      x += 1
+    bit = v
+    bits = 1  # Bits decoded
+    width = ticks_diff(times[x + 1], times[x])
+    if not 222 < width < 1555:
+      return self.BADBLOCK
+    if width < 1111:  # Short, we know width of next
+      x += 2
+    else:
+      bit ^= 1
+      x += 1
+    v = (v << 1) | bit  # MSB of result
+    bits += 1
+    # Decode bitstream
+    while bits < 17:
+      # -1 convert count to index, -1 allow for 2nd edge of pair
+      if x > nedges - 2:
+        return self.BADBLOCK
+      # width is 444/889 nominal
+      width = ticks_diff(times[x + 1], times[x])
+      if not 222 < width < 1111:
+        return self.BADBLOCK
+      if width < 666:  # Short
+        x += 2
+      else:
+        bit ^= 1
+        x += 1
+      v = (v << 1) | bit
+      bits += 1
+    self._addr = (v >> 8) & 0xff
+    self._ext = (v >> 16) & 1
+    return v & 0xff
@@ -0,0 +1,80 @@
+# sony.py Decoder for IR remote control using synchronous code
+# Sony SIRC protocol.
+
+# Author: Peter Hinch
+# Copyright Peter Hinch 2020 Released under the MIT license
+
+# Adapted: decoders return integer codes instead of raising exceptions,
+# see stm32_nec.py
+
+from micropython import const
+from utime import ticks_diff
+from stm32_ir_receiver import IR_RX
+
+_SONY_EDGES = const(42)
+
+class SONY_ABC(IR_RX):  # Abstract base class
+  # 20 bit block has 42 edges and lasts <= 39ms nominal. Add 4ms to time
+  # for tolerance.
+  NEDGES = _SONY_EDGES
+  TBLOCK = 43
+
+  def __init__(self, pin, bits, callback, *args):
+    super().__init__(pin, self.NEDGES, self.TBLOCK, callback, *args)
+    self._addr = 0
+    self._ext = 0
+    self._bits = bits
+
+  def decode(self, _):
+    cmd = self._decode()
+    if cmd < 0:
+      self._addr = 0
+      self._ext = 0
+    self.do_callback(cmd, self._addr, self._ext)
+
+  # Returns the command (>= 0, self._addr and self._ext, the extended 8 bit field
+  # of 20 bit frames, are then updated) or an error code
+  def _decode(self):
+    times = self._times
+    nedges = self.edge  # No. of edges detected
+    if nedges > _SONY_EDGES:
+      return self.OVERRUN
+    bits = (nedges - 2) // 2
+    if (nedges != 26 and nedges != 32 and nedges != 42) or bits > self._bits:
+      return self.BADBLOCK
+    width = ticks_diff(times[1], times[0])
+    if not 1800 < width < 3000:  # 2.4ms leading mark for all valid data
+      return self.BADSTART
+    width = ticks_diff(times[2], times[1])
+    if not 350 < width < 1000:  # 600μs space
+      return self.BADSTART
+
+    val = 0  # Data received, LSB 1st
+    x = 2
+    bit = 1
+    while x <= nedges - 2:
+      if ticks_diff(times[x + 1], times[x]) > 900:
+        val |= bit
+      bit <<= 1
+      x += 2
+    cmd = val & 0x7f  # 7 bit command
+    val >>= 7
+    if nedges < 42:
+      self._addr = val & 0xff  # 5 or 8 bit addr
+      self._ext = 0
+    else:
+      self._addr = val & 0x1f  # 5 bit addr
+      self._ext = val >> 5  # 8 bit extended
+    return cmd
+
+class SONY_12(SONY_ABC):
+  def __init__(self, pin, callback, *args):
+    super().__init__(pin, 12, callback, *args)
+
+class SONY_15(SONY_ABC):
+  def __init__(self, pin, callback, *args):
+    super().__init__(pin, 15, callback, *args)
+
+class SONY_20(SONY_ABC):
+  def __init__(self, pin, callback, *args):
+    super().__init__(pin, 20, callback, *args)